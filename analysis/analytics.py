@@ -62,12 +62,13 @@ class ProcurementAnalytics:
         cursor.execute('''
             SELECT 
                 naics_code,
-                naics_description,
+                (SELECT naics_description FROM naics_codes n
+                 WHERE n.naics_code = s.naics_code) as naics_description,
                 COUNT(*) as total_opportunities,
                 COUNT(CASE WHEN is_small_business_setaside = 1 THEN 1 END) as small_biz_opportunities,
                 ROUND(COUNT(CASE WHEN is_small_business_setaside = 1 THEN 1 END) * 100.0 / COUNT(*), 1) as small_biz_percentage,
                 COUNT(DISTINCT department) as number_of_agencies
-            FROM solicitations
+            FROM solicitations s
             WHERE naics_code IS NOT NULL AND naics_code != ''
             GROUP BY naics_code
             ORDER BY total_opportunities DESC
@@ -180,8 +181,11 @@ class ProcurementAnalytics:
         
         # Top NAICS codes
         cursor.execute('''
-            SELECT naics_code, naics_description, COUNT(*) as count
-            FROM solicitations
+            SELECT naics_code,
+                   (SELECT naics_description FROM naics_codes n
+                    WHERE n.naics_code = s.naics_code) as naics_description,
+                   COUNT(*) as count
+            FROM solicitations s
             WHERE department = ?
             GROUP BY naics_code
             ORDER BY count DESC
@@ -6,6 +6,8 @@ and parses structured SOW/PWS and evaluation criteria data.
 """
 
 import io
+import logging
+import os
 import re
 import json
 from datetime import datetime
@@ -16,10 +18,26 @@ from typing import Dict, List, Optional
 # Text extraction
 # ---------------------------------------------------------------------------
 
-def extract_text_from_docx(file_bytes: bytes) -> str:
-    """Extract text from a DOCX file, including table content."""
+# pdfminer (under pdfplumber) warns about every malformed page it meets,
+# which floods the console on a bulk run. Keep only its errors; set at
+# import so extraction worker processes get it too.
+logging.getLogger("pdfminer").setLevel(logging.ERROR)
+
+
+def _as_file(source):
+    """Return a path or file object the parsers can open for *source*.
+
+    *source* is either the file's bytes or a path to it on disk.
+    """
+    if isinstance(source, os.PathLike):
+        return os.fspath(source)
+    return io.BytesIO(source)
+
+
+def extract_text_from_docx(source) -> str:
+    """Extract text from a DOCX file (bytes or path), including table content."""
     import docx
-    doc = docx.Document(io.BytesIO(file_bytes))
+    doc = docx.Document(_as_file(source))
 
     parts = []
     for para in doc.paragraphs:
@@ -36,11 +54,44 @@ def extract_text_from_docx(file_bytes: bytes) -> str:
     return "\n".join(parts)
 
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
-    """Extract text from a PDF file using pdfplumber."""
+def extract_text_from_pdf(source) -> str:
+    """Extract text from a PDF file (bytes or path).
+
+    Uses PyMuPDF when it is installed, which is roughly an order of magnitude
+    faster than pdfplumber, and falls back to pdfplumber if it is missing or
+    cannot open the file. Given a path, PyMuPDF maps the file instead of
+    needing a second in-memory copy.
+    """
+    try:
+        import fitz
+    except ImportError:
+        return _extract_text_from_pdf_pdfplumber(source)
+
+    # Damaged files are retried with pdfplumber, so MuPDF's own stderr
+    # messages about them are noise
+    fitz.TOOLS.mupdf_display_errors(False)
+    try:
+        flags = fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_DEHYPHENATE
+        parts = []
+        if isinstance(source, os.PathLike):
+            pdf = fitz.open(os.fspath(source), filetype="pdf")
+        else:
+            pdf = fitz.open(stream=source, filetype="pdf")
+        with pdf:
+            for page in pdf:
+                text = page.get_text("text", flags=flags).strip()
+                if text:
+                    parts.append(text)
+        return "\n".join(parts)
+    except Exception:
+        return _extract_text_from_pdf_pdfplumber(source)
+
+
+def _extract_text_from_pdf_pdfplumber(source) -> str:
+    """Extract text from a PDF file (bytes or path) using pdfplumber."""
     import pdfplumber
     parts = []
-    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+    with pdfplumber.open(_as_file(source)) as pdf:
         for page in pdf.pages:
             text = page.extract_text()
             if text:
@@ -60,12 +111,16 @@ def extract_text(filename: str, content) -> str:
 
     Args:
         filename: Original filename (used to detect format).
-        content: bytes for PDF/DOCX, str for HTML.
+        content: bytes for PDF/DOCX, str for HTML, or a Path to the
+            downloaded file for any format.
 
     Returns:
         Extracted plain text.
     """
     lower = filename.lower()
+    if isinstance(content, os.PathLike) and not lower.endswith((".docx", ".pdf")):
+        with open(content, "rb") as f:
+            content = f.read()
     if lower.endswith(".docx"):
         return extract_text_from_docx(content)
     elif lower.endswith(".pdf"):
@@ -100,6 +155,15 @@ EVAL_SIGNALS = [
     "adjectival rating", "rating scale",
 ]
 
+# Strong indicators of an RFP/solicitation document
+SOL_SIGNALS = [
+    "request for proposal", "rfp", "solicitation number",
+    "section l", "section m", "offeror", "offerors",
+    "phase i", "phase ii", "submission instructions",
+    "representations and certifications", "evaluation and selection",
+    "advisory down-select", "instructions to offerors",
+]
+
 
 def classify_document(filename: str, text_preview: str) -> str:
     """Classify a document based on filename and text content.
@@ -115,30 +179,18 @@ def classify_document(filename: str, text_preview: str) -> str:
     if "sow" in lower_name and "rfp" not in lower_name:
         return "sow"
 
-    # Score SOW signals
+    # Any solicitation signal decides it, so the other lists are only
+    # scanned for documents without one
+    if any(s in preview for s in SOL_SIGNALS):
+        return "solicitation"
+
     sow_score = sum(1 for s in SOW_SIGNALS if s in preview)
     eval_score = sum(1 for s in EVAL_SIGNALS if s in preview)
 
-    # Solicitation-specific signals (strong indicators of an RFP/solicitation doc)
-    sol_signals = [
-        "request for proposal", "rfp", "solicitation number",
-        "section l", "section m", "offeror", "offerors",
-        "phase i", "phase ii", "submission instructions",
-        "representations and certifications", "evaluation and selection",
-        "advisory down-select", "instructions to offerors",
-    ]
-    sol_score = sum(1 for s in sol_signals if s in preview)
-
-    if sol_score >= 3:
-        return "solicitation"
-    if sol_score >= 1 and eval_score >= 2:
-        return "solicitation"
     if eval_score >= 3 and eval_score > sow_score:
         return "evaluation_criteria"
-    if sow_score >= 3 and sol_score == 0:
+    if sow_score >= 3:
         return "sow"
-    if sol_score >= 1:
-        return "solicitation"
 
     return "unknown"
 
@@ -394,6 +446,7 @@ def extract_evaluation_factors(document_id: int, solicitation_id: Optional[int],
     Returns a list of dicts matching the evaluation_criteria table schema.
     """
     factors = []
+    created_at = datetime.now().isoformat()  # shared by every factor found
 
     # Pattern 1: "Factor N: Name" or "Factor N - Name"
     factor_pattern = re.compile(
@@ -432,7 +485,7 @@ def extract_evaluation_factors(document_id: int, solicitation_id: Optional[int],
             "description": section[:1000].strip(),
             "page_limit": page_limit,
             "rating_method": rating_method,
-            "created_at": datetime.now().isoformat(),
+            "created_at": created_at,
         })
 
     # Pattern 2: If no "Factor N" found, try numbered list "1. Technical Approach"
@@ -459,7 +512,7 @@ def extract_evaluation_factors(document_id: int, solicitation_id: Optional[int],
                         "description": "",
                         "page_limit": "",
                         "rating_method": "",
-                        "created_at": datetime.now().isoformat(),
+                        "created_at": created_at,
                     })
 
     return factors
@@ -15,7 +15,6 @@ import argparse
 import json
 import os
 import sys
-from collections import Counter
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from database import ProcurementDatabase
@@ -63,22 +62,36 @@ class SOWReviewer:
     def review_opportunity(self, notice_id: str) -> dict:
         """Return a full structured review dict for a notice."""
         # Solicitation metadata
-        self.cursor.execute(
-            "SELECT * FROM solicitations WHERE notice_id = ?", (notice_id,)
-        )
+        self.cursor.execute('''
+            SELECT s.*, n.naics_description
+            FROM solicitations s
+            LEFT JOIN naics_codes n ON n.naics_code = s.naics_code
+            WHERE s.notice_id = ?
+        ''', (notice_id,))
         sol = self.cursor.fetchone()
         meta = dict(sol) if sol else {}
 
         # Documents
-        self.cursor.execute(
-            "SELECT * FROM opportunity_documents WHERE notice_id = ?", (notice_id,)
-        )
+        self.cursor.execute('''
+            SELECT d.*, b.content AS raw_text
+            FROM opportunity_documents d
+            LEFT JOIN doc_blobs b ON b.sha256 = d.raw_text_sha
+            WHERE d.notice_id = ?
+        ''', (notice_id,))
         docs = [dict(r) for r in self.cursor.fetchall()]
 
         # SOW analysis
-        self.cursor.execute(
-            "SELECT * FROM sow_analysis WHERE notice_id = ?", (notice_id,)
-        )
+        self.cursor.execute('''
+            SELECT id, document_id, solicitation_id, notice_id, scope_summary,
+                   period_of_performance, place_of_performance,
+                   json(key_tasks) AS key_tasks,
+                   json(labor_categories) AS labor_categories,
+                   json(deliverables) AS deliverables,
+                   json(compliance_reqs) AS compliance_reqs,
+                   ordering_mechanism, billing_instructions, confidence_score,
+                   extraction_method, created_at
+            FROM sow_analysis WHERE notice_id = ?
+        ''', (notice_id,))
         sow_rows = [dict(r) for r in self.cursor.fetchall()]
         for row in sow_rows:
             for field in ("key_tasks", "labor_categories", "deliverables", "compliance_reqs"):
@@ -86,10 +99,13 @@ class SOWReviewer:
                     row[field] = json.loads(row[field])
 
         # Evaluation criteria
-        self.cursor.execute(
-            "SELECT * FROM evaluation_criteria WHERE notice_id = ? ORDER BY factor_number",
-            (notice_id,)
-        )
+        self.cursor.execute('''
+            SELECT id, document_id, solicitation_id, notice_id, evaluation_phase,
+                   factor_number, factor_name, factor_weight,
+                   json(subfactors) AS subfactors,
+                   description, page_limit, rating_method, created_at
+            FROM evaluation_criteria WHERE notice_id = ? ORDER BY factor_number
+        ''', (notice_id,))
         eval_rows = [dict(r) for r in self.cursor.fetchall()]
         for row in eval_rows:
             if row.get("subfactors"):
@@ -225,17 +241,16 @@ class SOWReviewer:
     def common_labor_categories(self, agency: str):
         """Aggregate labor categories across SOWs for an agency."""
         self.cursor.execute('''
-            SELECT sa.labor_categories
+            SELECT cat.value AS category, COUNT(*) AS cnt
             FROM sow_analysis sa
-            JOIN solicitations s ON sa.notice_id = s.notice_id
+            JOIN solicitations s ON sa.notice_id = s.notice_id,
+                 json_each(sa.labor_categories) cat
             WHERE s.department LIKE ?
+            GROUP BY cat.value
+            ORDER BY cnt DESC, cat.value
+            LIMIT 30
         ''', (f"%{agency}%",))
-
-        counter = Counter()
-        for row in self.cursor.fetchall():
-            cats = json.loads(row["labor_categories"]) if row["labor_categories"] else []
-            counter.update(cats)
-        return counter.most_common(30)
+        return [(row["category"], row["cnt"]) for row in self.cursor.fetchall()]
 
     def opportunities_with_documents(self, agency: str):
         """List opportunities that have parsed documents."""
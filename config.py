@@ -7,6 +7,16 @@ import os
 SAM_API_KEY = os.environ.get("SAM_API_KEY", "")
 SAM_API_BASE_URL = "https://api.sam.gov/opportunities/v2/search"
 
+# SAM.gov pacing, as token-bucket rates shared by all worker threads. Search
+# pages are not paced; agency-targeted collection spaces its search slices
+# 3 seconds apart, and description/attachment calls are spaced 2 seconds
+# apart, the same as the old per-request sleeps.
+SAM_SEARCH_SLICES_PER_SECOND = 1 / 3
+SAM_DOCUMENT_REQUESTS_PER_SECOND = 1 / 2
+MAX_CONCURRENT_REQUESTS = 4
+# Attachment downloads in flight at once for a single notice
+MAX_CONCURRENT_DOWNLOADS = 4
+
 
 def validate_config():
     """Check that required configuration is set."""
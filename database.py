@@ -3,79 +3,439 @@ Database schema for comprehensive federal procurement data collection.
 This supports building a data analytics business.
 """
 
+import hashlib
 import os
+import queue
 import sqlite3
-from datetime import datetime
+import threading
+import warnings
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from typing import Optional
 
 _PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 _DEFAULT_DB = os.path.join(_PROJECT_ROOT, 'db', 'federal_procurement.db')
 
+# Read-only connections kept alongside the writer for concurrent stats queries
+READER_POOL_SIZE = 4
+
+# Bump whenever create_tables() changes so existing databases are migrated.
+SCHEMA_VERSION = 12
+
+# SQLite 3.45+ can store JSON lists in the binary jsonb encoding; older builds
+# keep minified text. Read these columns back through json() either way.
+_JSON_PARAM = 'jsonb(?)' if sqlite3.sqlite_version_info >= (3, 45, 0) else 'json(?)'
+
+# Caller-supplied solicitation columns, in insert order. The UPSERT statement
+# and the row builder are both generated from this tuple so they stay in sync.
+_SOL_DATA_COLS = (
+    'notice_id', 'solicitation_number', 'title',
+    'department', 'sub_tier', 'office', 'full_parent_path',
+    'naics_code', 'psc_code', 'set_aside', 'type_of_notice',
+    'posted_date', 'response_deadline', 'archive_date',
+    'estimated_value_low', 'estimated_value_high',
+    'place_of_performance_city', 'place_of_performance_state',
+    'place_of_performance_zip', 'place_of_performance_country',
+    'primary_contact_name', 'primary_contact_email', 'primary_contact_phone',
+    'url',
+)
+_SOL_COLS = _SOL_DATA_COLS + ('data_source', 'collected_date', 'last_updated')
+
+# Timestamps are generated inside SQLite rather than bound per row
+_SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+
+# Money is stored as INTEGER cents. Callers keep passing dollars; this
+# placeholder converts on the way in, and queries divide by 100.0 on the way out.
+_CENTS_PARAM = 'CAST(round(? * 100) AS INTEGER)'
+_MONEY_COLUMNS = (
+    ('solicitations', 'estimated_value_low'),
+    ('solicitations', 'estimated_value_high'),
+    ('forecast_opportunities', 'estimated_value_low'),
+    ('forecast_opportunities', 'estimated_value_high'),
+    ('contract_awards', 'award_amount'),
+)
+_SOL_PARAMS = {'estimated_value_low': _CENTS_PARAM, 'estimated_value_high': _CENTS_PARAM}
+
+# Update in place on conflict so the row id stays stable for foreign keys,
+# and skip the write entirely when none of the data columns changed
+_SOL_COMPARED_COLS = [c for c in _SOL_DATA_COLS if c != 'notice_id'] + ['data_source']
+_SOL_UPSERT_SQL = (
+    f"INSERT INTO solicitations ({', '.join(_SOL_COLS)}) "
+    f"VALUES ({', '.join(_SOL_PARAMS.get(c, '?') for c in _SOL_DATA_COLS)}, ?, {_SQL_NOW}, {_SQL_NOW}) "
+    f"ON CONFLICT(notice_id) DO UPDATE SET "
+    + ', '.join(f'{c} = excluded.{c}' for c in _SOL_COLS if c != 'notice_id')
+    + f" WHERE ({', '.join(f'solicitations.{c}' for c in _SOL_COMPARED_COLS)})"
+    + f" IS NOT ({', '.join(f'excluded.{c}' for c in _SOL_COMPARED_COLS)})"
+)
+
+# NAICS descriptions are dictionary-encoded: stored once per code in
+# naics_codes and joined back in by readers
+_NAICS_UPSERT_SQL = (
+    f"INSERT INTO naics_codes (naics_code, naics_description, first_seen) VALUES (?, ?, {_SQL_NOW}) "
+    "ON CONFLICT(naics_code) DO UPDATE SET naics_description = excluded.naics_description "
+    "WHERE naics_codes.naics_description IS NOT excluded.naics_description"
+)
+
+# The long description text lives in solicitation_bodies, one row per
+# solicitation, so scans of solicitations only page through the short columns.
+# Keyed on notice_id because executemany cannot hand back each row's id.
+_BODY_UPSERT_SQL = '''
+    INSERT INTO solicitation_bodies (solicitation_id, description)
+    SELECT id, ? FROM solicitations WHERE notice_id = ?
+    ON CONFLICT(solicitation_id) DO UPDATE SET description = excluded.description
+    WHERE solicitation_bodies.description IS NOT excluded.description
+'''
+
+# Document rows and their de-duplicated text, run once per stored file.
+# 'now' is fixed for a whole statement, so created_at and updated_at match.
+# A row whose download failed is replaced by the next attempt; any other
+# existing row is left alone and RETURNING yields nothing.
+_DOC_COLS = (
+    'solicitation_id', 'notice_id', 'filename', 'file_url', 'file_type',
+    'content_sha256', 'etag', 'last_modified', 'doc_role', 'raw_text_sha',
+    'description_html_sha', 'download_status', 'parse_status', 'error_message',
+)
+_DOC_INSERT_SQL = (
+    f"INSERT INTO opportunity_documents ({', '.join(_DOC_COLS)}, created_at, updated_at) "
+    f"VALUES ({', '.join('?' for _ in _DOC_COLS)}, {_SQL_NOW}, {_SQL_NOW}) "
+    "ON CONFLICT(notice_id, file_url) DO UPDATE SET "
+    + ', '.join(f'{c} = excluded.{c}' for c in _DOC_COLS if c not in ('notice_id', 'file_url'))
+    + ", updated_at = excluded.updated_at"
+    " WHERE opportunity_documents.download_status = 'error'"
+    " RETURNING id"
+)
+_BLOB_INSERT_SQL = 'INSERT OR IGNORE INTO doc_blobs (sha256, content) VALUES (?, ?)'
+
+# Imported rows are skipped when their natural key is already present. The
+# check is part of the INSERT, so executemany() applies it row by row,
+# including against rows earlier in the same batch.
+_LABOR_COLS = (
+    'notice_id', 'solicitation_id', 'source_file', 'category_name',
+    'category_title', 'clin_number', 'hourly_rate', 'estimated_hours',
+    'extended_price', 'period_name', 'period_number', 'site_type',
+    'agency', 'data_source', 'created_at',
+)
+_LABOR_INSERT_SQL = f'''
+    INSERT INTO labor_categories ({', '.join(_LABOR_COLS)})
+    SELECT {', '.join(_SQL_NOW if c == 'created_at' else ':' + c for c in _LABOR_COLS)}
+    WHERE NOT EXISTS (
+        SELECT 1 FROM labor_categories
+        WHERE notice_id = :notice_id AND category_name = :category_name
+          AND period_number = :period_number AND site_type IS :site_type
+    )
+'''
+_FORECAST_COLS = (
+    'agency', 'office_code', 'office_name', 'project_description',
+    'estimated_amount_category', 'estimated_value_low', 'estimated_value_high',
+    'acquisition_strategy', 'estimated_quarter', 'estimated_award_date',
+    'fiscal_year', 'source_document', 'source_url', 'collected_date', 'notes',
+)
+_FORECAST_PARAMS = {
+    'estimated_value_low': _CENTS_PARAM.replace('?', ':estimated_value_low'),
+    'estimated_value_high': _CENTS_PARAM.replace('?', ':estimated_value_high'),
+    'collected_date': _SQL_NOW,
+}
+_FORECAST_INSERT_SQL = f'''
+    INSERT INTO forecast_opportunities ({', '.join(_FORECAST_COLS)})
+    SELECT {', '.join(_FORECAST_PARAMS.get(c, ':' + c) for c in _FORECAST_COLS)}
+    WHERE NOT EXISTS (
+        SELECT 1 FROM forecast_opportunities
+        WHERE agency = :agency AND project_description = :project_description
+          AND fiscal_year = :fiscal_year
+    )
+'''
+
+# Main solicitations table. Kept at module level so migrations can rebuild it
+# under a temporary name via _rebuild_table().
+_SOLICITATIONS_DDL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        notice_id TEXT UNIQUE NOT NULL,
+        solicitation_number TEXT,
+        title TEXT,
+        
+        -- Agency information
+        department TEXT,
+        sub_tier TEXT,
+        office TEXT,
+        full_parent_path TEXT,
+        
+        -- Classification
+        naics_code TEXT,  -- description lives once in naics_codes
+        psc_code TEXT,
+        set_aside TEXT,
+        type_of_notice TEXT,
+        
+        -- Dates
+        posted_date TEXT,
+        response_deadline TEXT,
+        archive_date TEXT,
+        
+        -- Contract details (amounts in integer cents)
+        estimated_value_low INTEGER,
+        estimated_value_high INTEGER,
+        place_of_performance_city TEXT,
+        place_of_performance_state TEXT,
+        place_of_performance_zip TEXT,
+        place_of_performance_country TEXT,
+        
+        -- Contact
+        primary_contact_name TEXT,
+        primary_contact_email TEXT,
+        primary_contact_phone TEXT,
+        
+        -- Metadata
+        url TEXT,
+        data_source TEXT,
+        collected_date TEXT,
+        last_updated TEXT,
+        
+        -- Computed fields (days_to_deadline lives in solicitations_with_deadline)
+        is_small_agency BOOLEAN,
+        is_small_business_setaside BOOLEAN GENERATED ALWAYS AS (
+            COALESCE(
+                set_aside IN ('SBA', 'SBP', '8A', '8AN', 'HZC', 'HZS',
+                              'SDVOSBC', 'SDVOSBS', 'WOSB', 'WOSBSS',
+                              'EDWOSB', 'EDWOSBSS', 'VSA', 'VSS')
+                OR set_aside LIKE '%Small Business%'
+                OR set_aside LIKE '%8(a)%'
+                OR set_aside LIKE '%HUBZone%',
+                0)
+        ) STORED
+    )
+'''
+
+# Downloaded documents — one row per file per notice. The UNIQUE key also
+# serves notice_id lookups, so there is no separate notice_id index.
+_DOCUMENTS_DDL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        solicitation_id INTEGER,
+        notice_id TEXT NOT NULL,
+        filename TEXT,
+        file_url TEXT,
+        file_type TEXT,
+        content_sha256 BLOB,  -- digest of the downloaded file
+        etag TEXT,  -- HTTP validators for conditional re-downloads
+        last_modified TEXT,
+        doc_role TEXT DEFAULT 'unknown',
+        raw_text_sha BLOB,
+        description_html_sha BLOB,
+        download_status TEXT DEFAULT 'pending',
+        parse_status TEXT DEFAULT 'pending',
+        error_message TEXT,
+        created_at TEXT,
+        updated_at TEXT,
+        UNIQUE (notice_id, file_url),
+        FOREIGN KEY (solicitation_id) REFERENCES solicitations (id)
+    )
+'''
+
+# Secondary indexes as (name, table(columns)). The solicitations ones are
+# dropped around bulk loads by drop_indexes()/create_indexes().
+_SOLICITATION_INDEXES = (
+    ('idx_posted_date', 'solicitations(posted_date)'),
+    ('idx_department', 'solicitations(department)'),
+    # Covers get_naics_stats so NAICS lookups never touch the table
+    ('idx_naics_cover', 'solicitations(naics_code, department, is_small_business_setaside, estimated_value_high)'),
+    ('idx_set_aside', 'solicitations(set_aside)'),
+    ('idx_response_deadline', 'solicitations(response_deadline)'),
+    # Partial: only set-aside rows are indexed, ordered for the open-opportunity
+    # deadline scans. A full index on a 0/1 column was mostly dead weight.
+    ('idx_small_biz', 'solicitations(response_deadline) WHERE is_small_business_setaside = 1'),
+)
+_OTHER_INDEXES = (
+    ('idx_doc_role', 'opportunity_documents(doc_role)'),
+    ('idx_doc_content', 'opportunity_documents(content_sha256)'),
+    ('idx_doc_url', 'opportunity_documents(file_url)'),
+    ('idx_doc_text', 'opportunity_documents(raw_text_sha)'),
+    ('idx_sow_notice', 'sow_analysis(notice_id)'),
+    ('idx_eval_notice', 'evaluation_criteria(notice_id)'),
+    ('idx_forecast_agency', 'forecast_opportunities(agency)'),
+    ('idx_labor_notice', 'labor_categories(notice_id)'),
+    ('idx_labor_agency', 'labor_categories(agency)'),
+)
+
+# Hot filters that must stay index-backed; checked by verify_plans() after bulk loads
+_HOT_QUERIES = (
+    "SELECT COUNT(*) FROM solicitations WHERE department = ?",
+    "SELECT COUNT(*) FROM solicitations WHERE naics_code = ?",
+    "SELECT COUNT(*) FROM solicitations WHERE posted_date >= ?",
+)
+
+
+def _solicitation_row(sol_data: dict) -> tuple:
+    """Build the UPSERT parameter tuple (data columns + data_source) for one dict."""
+    return tuple(map(sol_data.get, _SOL_DATA_COLS)) + (
+        sol_data.get('data_source', 'SAM.gov API'),)
+
+
+def _labor_row(data: dict) -> dict:
+    """Build the labor_categories insert parameters for one dict."""
+    return {
+        'notice_id': data.get('notice_id'),
+        'solicitation_id': data.get('solicitation_id'),
+        'source_file': data.get('source_file', ''),
+        'category_name': data.get('category_name'),
+        'category_title': data.get('category_title', ''),
+        'clin_number': data.get('clin_number', ''),
+        'hourly_rate': data.get('hourly_rate'),
+        'estimated_hours': data.get('estimated_hours'),
+        'extended_price': data.get('extended_price'),
+        'period_name': data.get('period_name', ''),
+        'period_number': data.get('period_number'),
+        'site_type': data.get('site_type'),
+        'agency': data.get('agency', ''),
+        'data_source': data.get('data_source', 'excel_import'),
+    }
+
+
+def _forecast_row(data: dict) -> dict:
+    """Build the forecast_opportunities insert parameters for one dict."""
+    return {
+        'agency': data.get('agency'),
+        'office_code': data.get('office_code', ''),
+        'office_name': data.get('office_name', ''),
+        'project_description': data.get('project_description'),
+        'estimated_amount_category': data.get('estimated_amount_category', ''),
+        'estimated_value_low': data.get('estimated_value_low'),
+        'estimated_value_high': data.get('estimated_value_high'),
+        'acquisition_strategy': data.get('acquisition_strategy', ''),
+        'estimated_quarter': data.get('estimated_quarter', ''),
+        'estimated_award_date': data.get('estimated_award_date', ''),
+        'fiscal_year': data.get('fiscal_year', 2026),
+        'source_document': data.get('source_document', ''),
+        'source_url': data.get('source_url', ''),
+        'notes': data.get('notes', ''),
+    }
+
+
+def _sam_row(o, notice_type: str) -> tuple:
+    """Build the UPSERT parameter tuple straight from a SAM.gov Opportunity."""
+    return (
+        o.notice_id, o.solicitation_number, o.title,
+        o.department, o.sub_tier, o.office, None,
+        o.naics_code, None, o.set_aside, notice_type,
+        o.posted_date.isoformat() if o.posted_date else None,
+        o.response_deadline.isoformat() if o.response_deadline else None,
+        None,
+        None, None,
+        o.place_of_performance, None,
+        None, None,
+        o.primary_contact, o.primary_contact_email, None,
+        o.url,
+        'SAM.gov API',
+    )
+
 
 class ProcurementDatabase:
     """Database for storing and analyzing federal procurement data."""
 
     def __init__(self, db_path: str = _DEFAULT_DB):
-        """Initialize database connection and create tables."""
+        """Initialize database connection and create tables if the schema is out of date."""
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
+        self._naics_known = set()
+        # Room for every statement this class issues so none get re-prepared.
+        # isolation_level=None stops the driver from issuing its own deferred
+        # BEGINs; writes go through transaction() instead.
+        self.conn = sqlite3.connect(db_path, cached_statements=256, isolation_level=None)
         self.conn.row_factory = sqlite3.Row
-        self.create_tables()
+        self.conn.execute('PRAGMA busy_timeout = 5000')
+        # Shared by the insert_* methods instead of allocating one per call
+        self._cursor = self.conn.cursor()
+        # WAL turns each commit into a sequential append and lets readers run
+        # alongside the writer; NORMAL drops the per-commit fsync of the WAL.
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute('PRAGMA cache_size = -100000')
+        self.conn.execute('PRAGMA temp_store = MEMORY')
+        self.conn.execute('PRAGMA mmap_size = 268435456')
+        self.conn.execute('PRAGMA wal_autocheckpoint = 1000')
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            self.create_tables()
+        # Enabled after migrations: table rebuilds drop parent tables
+        self.conn.execute('PRAGMA foreign_keys = ON')
+
+        # WAL lets any number of readers run alongside the single writer.
+        # Up to READER_POOL_SIZE read-only connections are opened on demand by
+        # reader(), so instances that never use them (a Flask request) don't
+        # pay for them. An in-memory database is private to its connection,
+        # so reads use it.
+        self._readers = queue.Queue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+
+    @contextmanager
+    def reader(self):
+        """Check out a read-only connection for the duration of a ``with`` block.
+
+        Safe to use from worker threads; falls back to the writer connection
+        for in-memory databases.
+        """
+        if self.db_path == ':memory:':
+            yield self.conn
+            return
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._reader_lock:
+                if self._reader_count < READER_POOL_SIZE:
+                    conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True,
+                                           check_same_thread=False, cached_statements=256)
+                    conn.row_factory = sqlite3.Row
+                    self._reader_count += 1
+            if conn is None:
+                conn = self._readers.get()  # all opened; wait for one to come back
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
     
-    def create_tables(self):
-        """Create database schema."""
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed writes as one transaction.
+
+        The outermost block takes the write lock up front with BEGIN IMMEDIATE,
+        so it cannot hit SQLITE_BUSY halfway through when upgrading from a read
+        lock. Nested blocks become savepoints, so callers can wrap a batch of
+        insert_* calls in one block and commit once at the end.
+        """
+        if self.conn.in_transaction:
+            self.conn.execute('SAVEPOINT nested')
+            try:
+                yield
+            except BaseException:
+                self.conn.execute('ROLLBACK TO nested')
+                self.conn.execute('RELEASE nested')
+                raise
+            self.conn.execute('RELEASE nested')
+            return
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def create_tables(self, create_indexes: bool = True):
+        """Create database schema.
+
+        Args:
+            create_indexes: Also create secondary indexes (see create_indexes)
+        """
         cursor = self.conn.cursor()
         
         # Main solicitations table
+        cursor.execute(_SOLICITATIONS_DDL.format(table='solicitations'))
+
+        # Solicitation description text, split out of the main table
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS solicitations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                notice_id TEXT UNIQUE NOT NULL,
-                solicitation_number TEXT,
-                title TEXT,
-                description TEXT,
-                
-                -- Agency information
-                department TEXT,
-                sub_tier TEXT,
-                office TEXT,
-                full_parent_path TEXT,
-                
-                -- Classification
-                naics_code TEXT,
-                naics_description TEXT,
-                psc_code TEXT,
-                set_aside TEXT,
-                type_of_notice TEXT,
-                
-                -- Dates
-                posted_date TEXT,
-                response_deadline TEXT,
-                archive_date TEXT,
-                
-                -- Contract details
-                estimated_value_low REAL,
-                estimated_value_high REAL,
-                place_of_performance_city TEXT,
-                place_of_performance_state TEXT,
-                place_of_performance_zip TEXT,
-                place_of_performance_country TEXT,
-                
-                -- Contact
-                primary_contact_name TEXT,
-                primary_contact_email TEXT,
-                primary_contact_phone TEXT,
-                
-                -- Metadata
-                url TEXT,
-                data_source TEXT,
-                collected_date TEXT,
-                last_updated TEXT,
-                
-                -- Computed fields
-                days_to_deadline INTEGER,
-                is_small_agency BOOLEAN,
-                is_small_business_setaside BOOLEAN
+            CREATE TABLE IF NOT EXISTS solicitation_bodies (
+                solicitation_id INTEGER PRIMARY KEY REFERENCES solicitations(id),
+                description TEXT
             )
         ''')
         
@@ -117,7 +477,7 @@ class ProcurementDatabase:
                 solicitation_id INTEGER,
                 award_number TEXT,
                 awarded_to TEXT,
-                award_amount REAL,
+                award_amount INTEGER,  -- cents
                 award_date TEXT,
                 awardee_duns TEXT,
                 awardee_cage_code TEXT,
@@ -156,24 +516,15 @@ class ProcurementDatabase:
             )
         ''')
         
-        # Downloaded documents — one row per file
+        cursor.execute(_DOCUMENTS_DDL.format(table='opportunity_documents'))
+
+        # Content-addressed text store — document text keyed by SHA-256 so
+        # boilerplate shared across solicitations is stored once. Archived
+        # description HTML is zlib-compressed and stored as a BLOB.
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS opportunity_documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                solicitation_id INTEGER,
-                notice_id TEXT NOT NULL,
-                filename TEXT,
-                file_url TEXT UNIQUE,
-                file_type TEXT,
-                doc_role TEXT DEFAULT 'unknown',
-                raw_text TEXT,
-                description_html TEXT,
-                download_status TEXT DEFAULT 'pending',
-                parse_status TEXT DEFAULT 'pending',
-                error_message TEXT,
-                created_at TEXT,
-                updated_at TEXT,
-                FOREIGN KEY (solicitation_id) REFERENCES solicitations (id)
+            CREATE TABLE IF NOT EXISTS doc_blobs (
+                sha256 BLOB PRIMARY KEY,
+                content TEXT
             )
         ''')
 
@@ -231,8 +582,8 @@ class ProcurementDatabase:
                 office_name TEXT,
                 project_description TEXT,
                 estimated_amount_category TEXT,
-                estimated_value_low REAL,
-                estimated_value_high REAL,
+                estimated_value_low INTEGER,  -- cents
+                estimated_value_high INTEGER,  -- cents
                 acquisition_strategy TEXT,
                 estimated_quarter TEXT,
                 estimated_award_date TEXT,
@@ -267,121 +618,513 @@ class ProcurementDatabase:
             )
         ''')
 
-        # Create indexes for common queries
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_posted_date ON solicitations(posted_date)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_department ON solicitations(department)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_naics ON solicitations(naics_code)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_set_aside ON solicitations(set_aside)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_response_deadline ON solicitations(response_deadline)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_doc_notice ON opportunity_documents(notice_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_doc_role ON opportunity_documents(doc_role)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sow_notice ON sow_analysis(notice_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_eval_notice ON evaluation_criteria(notice_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_forecast_agency ON forecast_opportunities(agency)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_labor_notice ON labor_categories(notice_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_labor_agency ON labor_categories(agency)')
+        # These run before any table rebuild, which would copy dollar values
+        # verbatim and drop the description columns unread
+        with self.transaction():
+            self._migrate_money_to_cents()
+            self._migrate_naics_descriptions()
+            self._migrate_solicitation_bodies()
+            self._migrate_document_text()
+            self._migrate_content_hash()
+            self._migrate_document_validators()
+            self._migrate_document_key()
+            self._migrate_computed_columns()
 
-        self.conn.commit()
+        # Superseded by idx_naics_cover, idx_small_biz and the
+        # opportunity_documents (notice_id, file_url) key
+        cursor.execute('DROP INDEX IF EXISTS idx_naics')
+        cursor.execute('DROP INDEX IF EXISTS idx_small_business')
+        cursor.execute('DROP INDEX IF EXISTS idx_doc_notice')
+        if create_indexes:
+            self.create_indexes()
+
+        # 'now' is not allowed in a generated column, so the deadline countdown is a view
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS solicitations_with_deadline AS
+            SELECT *,
+                   CAST(julianday(response_deadline) - julianday('now') AS INTEGER) AS days_to_deadline
+            FROM solicitations
+        ''')
+
+        # Full-text indexes over solicitation and SOW text, kept in sync by triggers
+        # The FTS index spans both tables, so its content source is a view
+        # and the triggers on each side look up the other side's column
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS solicitations_text AS
+            SELECT s.id, s.title, b.description
+            FROM solicitations s
+            LEFT JOIN solicitation_bodies b ON b.solicitation_id = s.id
+        ''')
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS solicitations_fts USING fts5(
+                title, description,
+                content='solicitations_text', content_rowid='id',
+                tokenize='porter unicode61'
+            )
+        ''')
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS solicitations_fts_ai AFTER INSERT ON solicitations BEGIN
+                INSERT INTO solicitations_fts (rowid, title, description)
+                VALUES (new.id, new.title,
+                        (SELECT description FROM solicitation_bodies WHERE solicitation_id = new.id));
+            END;
+            CREATE TRIGGER IF NOT EXISTS solicitations_fts_ad AFTER DELETE ON solicitations BEGIN
+                INSERT INTO solicitations_fts (solicitations_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title,
+                        (SELECT description FROM solicitation_bodies WHERE solicitation_id = old.id));
+            END;
+            CREATE TRIGGER IF NOT EXISTS solicitations_fts_au AFTER UPDATE OF title ON solicitations BEGIN
+                INSERT INTO solicitations_fts (solicitations_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title,
+                        (SELECT description FROM solicitation_bodies WHERE solicitation_id = old.id));
+                INSERT INTO solicitations_fts (rowid, title, description)
+                VALUES (new.id, new.title,
+                        (SELECT description FROM solicitation_bodies WHERE solicitation_id = new.id));
+            END;
+            CREATE TRIGGER IF NOT EXISTS solicitation_bodies_fts_ai AFTER INSERT ON solicitation_bodies BEGIN
+                INSERT INTO solicitations_fts (solicitations_fts, rowid, title, description)
+                SELECT 'delete', id, title, NULL FROM solicitations WHERE id = new.solicitation_id;
+                INSERT INTO solicitations_fts (rowid, title, description)
+                SELECT id, title, new.description FROM solicitations WHERE id = new.solicitation_id;
+            END;
+            CREATE TRIGGER IF NOT EXISTS solicitation_bodies_fts_au AFTER UPDATE ON solicitation_bodies BEGIN
+                INSERT INTO solicitations_fts (solicitations_fts, rowid, title, description)
+                SELECT 'delete', id, title, old.description FROM solicitations WHERE id = old.solicitation_id;
+                INSERT INTO solicitations_fts (rowid, title, description)
+                SELECT id, title, new.description FROM solicitations WHERE id = new.solicitation_id;
+            END;
+        ''')
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS sow_analysis_fts USING fts5(
+                scope_summary,
+                content='sow_analysis', content_rowid='id',
+                tokenize='porter unicode61'
+            )
+        ''')
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS sow_analysis_fts_ai AFTER INSERT ON sow_analysis BEGIN
+                INSERT INTO sow_analysis_fts (rowid, scope_summary) VALUES (new.id, new.scope_summary);
+            END;
+            CREATE TRIGGER IF NOT EXISTS sow_analysis_fts_ad AFTER DELETE ON sow_analysis BEGIN
+                INSERT INTO sow_analysis_fts (sow_analysis_fts, rowid, scope_summary)
+                VALUES ('delete', old.id, old.scope_summary);
+            END;
+            CREATE TRIGGER IF NOT EXISTS sow_analysis_fts_au AFTER UPDATE OF scope_summary ON sow_analysis BEGIN
+                INSERT INTO sow_analysis_fts (sow_analysis_fts, rowid, scope_summary)
+                VALUES ('delete', old.id, old.scope_summary);
+                INSERT INTO sow_analysis_fts (rowid, scope_summary) VALUES (new.id, new.scope_summary);
+            END;
+        ''')
+
+        with self.transaction():
+            # Index any rows written before the FTS tables existed
+            cursor.execute("INSERT INTO solicitations_fts (solicitations_fts) VALUES ('rebuild')")
+            cursor.execute("INSERT INTO sow_analysis_fts (sow_analysis_fts) VALUES ('rebuild')")
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def create_indexes(self):
+        """Create secondary indexes for common queries (idempotent)."""
+        with self.transaction():
+            for name, target in _SOLICITATION_INDEXES + _OTHER_INDEXES:
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+    def drop_indexes(self):
+        """Drop the solicitations secondary indexes ahead of a bulk load.
+
+        Call create_indexes() afterwards; building each index once over the
+        loaded table is much cheaper than maintaining it on every insert.
+        The notice_id UNIQUE index is kept because the UPSERT relies on it.
+        """
+        with self.transaction():
+            for name, _ in _SOLICITATION_INDEXES:
+                self.conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+    def verify_plans(self):
+        """Warn and re-ANALYZE if a hot query has stopped searching an index.
+
+        Statistics go stale as tables grow, so the collection scripts call
+        this after loading rather than every open paying for it.
+        """
+        for sql in _HOT_QUERIES:
+            plan = self.conn.execute(f'EXPLAIN QUERY PLAN {sql}', ('X',)).fetchall()
+            # A full index scan ("SCAN ... USING COVERING INDEX") is no better
+            if not any(row['detail'].startswith('SEARCH') for row in plan):
+                warnings.warn(f"query plan regressed to a table scan, running ANALYZE: {sql}",
+                              RuntimeWarning, stacklevel=2)
+                self.conn.execute('ANALYZE')
+                return
+
+    def _table_columns(self, table: str) -> list:
+        """Return the column names of *table*."""
+        return [row[1] for row in self.conn.execute(f'PRAGMA table_info({table})')]
+
+    def _rebuild_table(self, table: str, ddl: str):
+        """Recreate *table* from *ddl* (with a ``{table}`` placeholder), keeping its rows.
+
+        Plain columns present in both definitions are copied across, ids
+        included. Indexes, triggers and views go with the old table;
+        create_tables() recreates them afterwards.
+        """
+        cursor = self.conn.cursor()
+        new = f'{table}_new'
+        cursor.execute(f'DROP TABLE IF EXISTS {new}')
+        cursor.execute(ddl.format(table=new))
+        old_columns = set(self._table_columns(table))
+        columns = ', '.join(c for c in self._table_columns(new) if c in old_columns)
+        cursor.execute(f'INSERT INTO {new} ({columns}) SELECT {columns} FROM {table}')
+        views = cursor.execute("SELECT name FROM sqlite_master WHERE type = 'view'").fetchall()
+        for (view,) in views:
+            cursor.execute(f'DROP VIEW {view}')
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {new} RENAME TO {table}')
+
+    def _migrate_document_key(self):
+        """Rebuild older opportunity_documents tables that made file_url unique on its own."""
+        for index in self.conn.execute('PRAGMA index_list(opportunity_documents)').fetchall():
+            if not index['unique']:
+                continue
+            columns = [r['name'] for r in self.conn.execute(f"PRAGMA index_info('{index['name']}')")]
+            if columns == ['file_url']:
+                self._rebuild_table('opportunity_documents', _DOCUMENTS_DDL)
+                return
+
+    def _migrate_computed_columns(self):
+        """Replace app-maintained computed columns from older databases with generated ones."""
+        if 'days_to_deadline' in self._table_columns('solicitations'):
+            self._rebuild_table('solicitations', _SOLICITATIONS_DDL)
+
+    def _migrate_money_to_cents(self):
+        """Convert REAL dollar columns from older databases to INTEGER cents."""
+        for table, column in _MONEY_COLUMNS:
+            types = {row[1]: row[2] for row in self.conn.execute(f'PRAGMA table_info({table})')}
+            if types.get(column) != 'REAL':
+                continue
+            # DROP COLUMN refuses columns an index or view depends on;
+            # create_tables() recreates both afterwards
+            self.conn.execute('DROP INDEX IF EXISTS idx_naics_cover')
+            self.conn.execute('DROP VIEW IF EXISTS solicitations_with_deadline')
+            self.conn.execute(f'ALTER TABLE {table} ADD COLUMN {column}_cents INTEGER')
+            self.conn.execute(f'UPDATE {table} SET {column}_cents = CAST(round({column} * 100) AS INTEGER)')
+            self.conn.execute(f'ALTER TABLE {table} DROP COLUMN {column}')
+            self.conn.execute(f'ALTER TABLE {table} RENAME COLUMN {column}_cents TO {column}')
+
+    def _migrate_naics_descriptions(self):
+        """Move per-row NAICS descriptions from older databases into naics_codes."""
+        if 'naics_description' not in self._table_columns('solicitations'):
+            return
+        self.conn.execute('''
+            INSERT INTO naics_codes (naics_code, naics_description, first_seen)
+            SELECT naics_code, MAX(naics_description), MIN(collected_date) FROM solicitations
+            WHERE naics_code IS NOT NULL AND naics_code != '' AND naics_description != ''
+            GROUP BY naics_code
+            ON CONFLICT(naics_code) DO UPDATE SET naics_description = excluded.naics_description
+        ''')
+        self.conn.execute('DROP VIEW IF EXISTS solicitations_with_deadline')
+        self.conn.execute('ALTER TABLE solicitations DROP COLUMN naics_description')
+
+    def _migrate_solicitation_bodies(self):
+        """Move descriptions from older databases into solicitation_bodies."""
+        if 'description' not in self._table_columns('solicitations'):
+            return
+        self.conn.execute('''
+            INSERT OR IGNORE INTO solicitation_bodies (solicitation_id, description)
+            SELECT id, description FROM solicitations
+        ''')
+        # The old FTS index and its triggers read solicitations.description;
+        # create_tables() recreates them over solicitations_text and rebuilds
+        for trigger in ('ai', 'ad', 'au'):
+            self.conn.execute(f'DROP TRIGGER IF EXISTS solicitations_fts_{trigger}')
+        self.conn.execute('DROP TABLE IF EXISTS solicitations_fts')
+        self.conn.execute('DROP VIEW IF EXISTS solicitations_with_deadline')
+        self.conn.execute('ALTER TABLE solicitations DROP COLUMN description')
+
+    def _migrate_content_hash(self):
+        """Add the downloaded-file digest column to older opportunity_documents tables."""
+        if 'content_sha256' not in self._table_columns('opportunity_documents'):
+            self.conn.execute('ALTER TABLE opportunity_documents ADD COLUMN content_sha256 BLOB')
+
+    def _migrate_document_validators(self):
+        """Add the HTTP ETag/Last-Modified columns to older opportunity_documents tables."""
+        columns = self._table_columns('opportunity_documents')
+        for column in ('etag', 'last_modified'):
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE opportunity_documents ADD COLUMN {column} TEXT')
+
+    def _record_naics(self, pairs):
+        """Store (naics_code, description) pairs in naics_codes.
+
+        Codes this connection has already recorded are skipped without a
+        query, so a batch usually costs nothing here.
+        """
+        new = {code: desc for code, desc in pairs
+               if code and desc and code not in self._naics_known}
+        if new:
+            self.conn.executemany(_NAICS_UPSERT_SQL, new.items())
+            self._naics_known.update(new)
+
+    def _migrate_document_text(self):
+        """Move inline raw_text/description_html from older databases into doc_blobs."""
+        columns = self._table_columns('opportunity_documents')
+        if 'raw_text' not in columns:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute('ALTER TABLE opportunity_documents ADD COLUMN raw_text_sha BLOB')
+        cursor.execute('ALTER TABLE opportunity_documents ADD COLUMN description_html_sha BLOB')
+        rows = cursor.execute(
+            'SELECT id, raw_text, description_html FROM opportunity_documents'
+        ).fetchall()
+        for row in rows:
+            cursor.execute(
+                'UPDATE opportunity_documents SET raw_text_sha = ?, description_html_sha = ? WHERE id = ?',
+                (self._store_blob(row['raw_text']), self._store_blob(row['description_html']), row['id'])
+            )
+        cursor.execute('ALTER TABLE opportunity_documents DROP COLUMN raw_text')
+        cursor.execute('ALTER TABLE opportunity_documents DROP COLUMN description_html')
+
+    def _store_blob(self, content: Optional[str], compress: bool = False) -> Optional[bytes]:
+        """Store *content* in doc_blobs (once per unique value) and return its digest.
+
+        With *compress* the text is zlib-compressed first. The digest covers
+        the stored value, so a compressed copy never collides with plain text.
+        """
+        if not content:
+            return None
+        encoded = content.encode()
+        value = zlib.compress(encoded) if compress else content
+        digest = hashlib.sha256(value if compress else encoded).digest()
+        self._cursor.execute(_BLOB_INSERT_SQL, (digest, value))
+        return digest
+
+    def insert_document(self, doc: dict) -> Optional[tuple]:
+        """Insert a document record unless the notice already has its file_url.
+
+        An existing record whose download failed is overwritten instead.
+        Text fields (raw_text, description_html) are stored in doc_blobs and
+        referenced by digest; the HTML, kept only for reference, is
+        compressed. Returns (row ID, created) where created is False for an
+        existing document, or None on error.
+        """
+        cursor = self._cursor
+        try:
+            with self.transaction():
+                # The blobs are written while the parameters are built
+                cursor.execute(_DOC_INSERT_SQL, (
+                    doc.get("solicitation_id"),
+                    doc["notice_id"],
+                    doc.get("filename", ""),
+                    doc["file_url"],
+                    doc.get("file_type", ""),
+                    doc.get("content_sha256"),
+                    doc.get("etag"),
+                    doc.get("last_modified"),
+                    doc.get("doc_role", "unknown"),
+                    self._store_blob(doc.get("raw_text")),
+                    self._store_blob(doc.get("description_html"), compress=True),
+                    doc.get("download_status", "complete"),
+                    doc.get("parse_status", "complete"),
+                    doc.get("error_message", ""),
+                ))
+                row = cursor.fetchone()
+                if row:
+                    return row[0], True
+                row = cursor.execute(
+                    'SELECT id FROM opportunity_documents WHERE notice_id = ? AND file_url = ?',
+                    (doc["notice_id"], doc["file_url"])
+                ).fetchone()
+            return row[0], False
+        except Exception as e:
+            print(f"Error inserting document: {e}")
+            return None
     
+    def get_solicitation_id(self, notice_id: str) -> Optional[int]:
+        """Look up the solicitations table id for a notice_id."""
+        row = self._cursor.execute(
+            'SELECT id FROM solicitations WHERE notice_id = ?', (notice_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_description_html(self, document_id: int) -> Optional[str]:
+        """Return a document's archived description HTML, or None if it has none."""
+        row = self._cursor.execute('''
+            SELECT b.content FROM opportunity_documents d
+            JOIN doc_blobs b ON b.sha256 = d.description_html_sha
+            WHERE d.id = ?
+        ''', (document_id,)).fetchone()
+        if row is None:
+            return None
+        # HTML archived before compression was stored as plain text
+        content = row[0]
+        return zlib.decompress(content).decode() if isinstance(content, bytes) else content
+
+    def find_document_text(self, content_sha256: bytes) -> Optional[tuple]:
+        """Find an already-parsed document with the same downloaded file content.
+
+        Lets callers skip parsing attachments that are shared across notices.
+        Returns (doc_role, raw_text), or None if no parsed copy exists.
+        """
+        with self.reader() as conn:
+            row = conn.execute('''
+                SELECT d.doc_role, b.content
+                FROM opportunity_documents d
+                JOIN doc_blobs b ON b.sha256 = d.raw_text_sha
+                WHERE d.content_sha256 = ? AND d.parse_status = 'complete'
+                LIMIT 1
+            ''', (content_sha256,)).fetchone()
+        return tuple(row) if row else None
+
+    def find_notice_by_text(self, text: str) -> Optional[str]:
+        """Find the notice of an already-imported local document with exactly this text.
+
+        Matches the raw_text digest, so the same content under another
+        file name is found too. Only documents of local_import solicitations
+        count; a SAM.gov attachment with the same text is not a local import.
+        Returns the notice_id, or None.
+        """
+        digest = hashlib.sha256(text.encode()).digest()
+        with self.reader() as conn:
+            row = conn.execute('''
+                SELECT d.notice_id FROM opportunity_documents d
+                JOIN solicitations s ON s.notice_id = d.notice_id
+                WHERE d.raw_text_sha = ? AND d.parse_status = 'complete'
+                  AND s.data_source = 'local_import'
+                LIMIT 1
+            ''', (digest,)).fetchone()
+        return row[0] if row else None
+
+    def get_document_validators(self, file_url: str) -> Optional[tuple]:
+        """Find the HTTP validators of an earlier successful download of file_url.
+
+        Only parsed copies count, so a 304 response always has stored text
+        to fall back on. Returns (etag, last_modified, content_sha256), or
+        None if there is no such copy or the server sent neither header.
+        """
+        with self.reader() as conn:
+            row = conn.execute('''
+                SELECT etag, last_modified, content_sha256
+                FROM opportunity_documents
+                WHERE file_url = ? AND parse_status = 'complete'
+                  AND content_sha256 IS NOT NULL
+                  AND (etag IS NOT NULL OR last_modified IS NOT NULL)
+                LIMIT 1
+            ''', (file_url,)).fetchone()
+        return tuple(row) if row else None
+
+    def insert_sow_analysis(self, analysis: dict) -> Optional[int]:
+        """Insert a SOW analysis record built by doc_parser.build_sow_analysis.
+
+        The JSON list fields are stored via jsonb() where available.
+        Returns row ID if inserted, None on error.
+        """
+        cursor = self._cursor
+        try:
+            with self.transaction():
+                cursor.execute(f'''
+                    INSERT INTO sow_analysis
+                        (document_id, solicitation_id, notice_id,
+                         scope_summary, period_of_performance, place_of_performance,
+                         key_tasks, labor_categories, deliverables,
+                         compliance_reqs, ordering_mechanism, billing_instructions,
+                         confidence_score, extraction_method, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?,
+                            {_JSON_PARAM}, {_JSON_PARAM}, {_JSON_PARAM}, {_JSON_PARAM},
+                            ?, ?, ?, ?, ?)
+                ''', (
+                    analysis["document_id"], analysis["solicitation_id"], analysis["notice_id"],
+                    analysis["scope_summary"], analysis["period_of_performance"],
+                    analysis["place_of_performance"],
+                    analysis["key_tasks"], analysis["labor_categories"], analysis["deliverables"],
+                    analysis["compliance_reqs"], analysis["ordering_mechanism"],
+                    analysis["billing_instructions"],
+                    analysis["confidence_score"], analysis["extraction_method"],
+                    analysis["created_at"],
+                ))
+            return cursor.lastrowid
+        except Exception as e:
+            print(f"Error inserting SOW analysis: {e}")
+            return None
+
+    def insert_eval_factors(self, factors: list) -> int:
+        """Insert evaluation criteria records in one batch.
+
+        Returns the number of rows inserted (0 on error).
+        """
+        try:
+            with self.transaction():
+                self.conn.executemany(f'''
+                    INSERT INTO evaluation_criteria
+                        (document_id, solicitation_id, notice_id,
+                         evaluation_phase, factor_number, factor_name, factor_weight,
+                         subfactors, description, page_limit, rating_method, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, {_JSON_PARAM}, ?, ?, ?, ?)
+                ''', [(
+                    f["document_id"], f["solicitation_id"], f["notice_id"],
+                    f["evaluation_phase"], f["factor_number"], f["factor_name"],
+                    f["factor_weight"], f["subfactors"], f["description"],
+                    f["page_limit"], f["rating_method"], f["created_at"],
+                ) for f in factors])
+            return len(factors)
+        except Exception as e:
+            print(f"Error inserting evaluation factors: {e}")
+            return 0
+
     def insert_forecast_opportunity(self, data: dict) -> Optional[int]:
         """Insert a forecast opportunity if it doesn't already exist.
 
         Uses (agency, project_description, fiscal_year) as a uniqueness key.
         Returns row ID if inserted, None if duplicate or error.
         """
-        cursor = self.conn.cursor()
+        cursor = self._cursor
         try:
-            # Check for existing entry
-            cursor.execute('''
-                SELECT id FROM forecast_opportunities
-                WHERE agency = ? AND project_description = ? AND fiscal_year = ?
-            ''', (data.get('agency'), data.get('project_description'), data.get('fiscal_year', 2026)))
-            if cursor.fetchone():
-                return None  # duplicate
-
-            cursor.execute('''
-                INSERT INTO forecast_opportunities
-                    (agency, office_code, office_name, project_description,
-                     estimated_amount_category, estimated_value_low, estimated_value_high,
-                     acquisition_strategy, estimated_quarter, estimated_award_date,
-                     fiscal_year, source_document, source_url, collected_date, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data.get('agency'),
-                data.get('office_code', ''),
-                data.get('office_name', ''),
-                data.get('project_description'),
-                data.get('estimated_amount_category', ''),
-                data.get('estimated_value_low'),
-                data.get('estimated_value_high'),
-                data.get('acquisition_strategy', ''),
-                data.get('estimated_quarter', ''),
-                data.get('estimated_award_date', ''),
-                data.get('fiscal_year', 2026),
-                data.get('source_document', ''),
-                data.get('source_url', ''),
-                datetime.now().isoformat(),
-                data.get('notes', ''),
-            ))
-            self.conn.commit()
-            return cursor.lastrowid
+            with self.transaction():
+                cursor.execute(_FORECAST_INSERT_SQL, _forecast_row(data))
+            return cursor.lastrowid if cursor.rowcount else None
         except Exception as e:
             print(f"Error inserting forecast opportunity: {e}")
-            self.conn.rollback()
             return None
 
+    def insert_forecast_opportunities(self, rows: list) -> int:
+        """Insert many forecast opportunities in one batch, skipping duplicates.
+
+        Returns the number of rows inserted (0 on error).
+        """
+        cursor = self._cursor
+        try:
+            with self.transaction():
+                cursor.executemany(_FORECAST_INSERT_SQL, map(_forecast_row, rows))
+            return cursor.rowcount
+        except Exception as e:
+            print(f"Error inserting forecast opportunities: {e}")
+            return 0
+
     def insert_labor_category(self, data: dict) -> Optional[int]:
         """Insert a labor category if it doesn't already exist.
 
         Uses (notice_id, category_name, period_number, site_type) as uniqueness key.
         Returns row ID if inserted, None if duplicate or error.
         """
-        cursor = self.conn.cursor()
+        cursor = self._cursor
         try:
-            cursor.execute('''
-                SELECT id FROM labor_categories
-                WHERE notice_id = ? AND category_name = ?
-                  AND period_number = ? AND site_type IS ?
-            ''', (
-                data.get('notice_id'),
-                data.get('category_name'),
-                data.get('period_number'),
-                data.get('site_type'),
-            ))
-            if cursor.fetchone():
-                return None  # duplicate
-
-            cursor.execute('''
-                INSERT INTO labor_categories
-                    (notice_id, solicitation_id, source_file, category_name,
-                     category_title, clin_number, hourly_rate, estimated_hours,
-                     extended_price, period_name, period_number, site_type,
-                     agency, data_source, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data.get('notice_id'),
-                data.get('solicitation_id'),
-                data.get('source_file', ''),
-                data.get('category_name'),
-                data.get('category_title', ''),
-                data.get('clin_number', ''),
-                data.get('hourly_rate'),
-                data.get('estimated_hours'),
-                data.get('extended_price'),
-                data.get('period_name', ''),
-                data.get('period_number'),
-                data.get('site_type'),
-                data.get('agency', ''),
-                data.get('data_source', 'excel_import'),
-                datetime.now().isoformat(),
-            ))
-            self.conn.commit()
-            return cursor.lastrowid
+            with self.transaction():
+                cursor.execute(_LABOR_INSERT_SQL, _labor_row(data))
+            return cursor.lastrowid if cursor.rowcount else None
         except Exception as e:
             print(f"Error inserting labor category: {e}")
-            self.conn.rollback()
             return None
 
+    def insert_labor_categories(self, rows: list) -> int:
+        """Insert many labor categories in one batch, skipping duplicates.
+
+        Returns the number of rows inserted (0 on error).
+        """
+        cursor = self._cursor
+        try:
+            with self.transaction():
+                cursor.executemany(_LABOR_INSERT_SQL, map(_labor_row, rows))
+            return cursor.rowcount
+        except Exception as e:
+            print(f"Error inserting labor categories: {e}")
+            return 0
+
     def insert_solicitation(self, sol_data: dict) -> Optional[int]:
         """
         Insert or update a solicitation.
@@ -392,115 +1135,183 @@ class ProcurementDatabase:
         Returns:
             Row ID if successful, None otherwise
         """
-        cursor = self.conn.cursor()
+        cursor = self._cursor
         
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO solicitations (
-                    notice_id, solicitation_number, title, description,
-                    department, sub_tier, office, full_parent_path,
-                    naics_code, naics_description, psc_code, set_aside, type_of_notice,
-                    posted_date, response_deadline, archive_date,
-                    estimated_value_low, estimated_value_high,
-                    place_of_performance_city, place_of_performance_state,
-                    place_of_performance_zip, place_of_performance_country,
-                    primary_contact_name, primary_contact_email, primary_contact_phone,
-                    url, data_source, collected_date, last_updated
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                sol_data.get('notice_id'),
-                sol_data.get('solicitation_number'),
-                sol_data.get('title'),
-                sol_data.get('description'),
-                sol_data.get('department'),
-                sol_data.get('sub_tier'),
-                sol_data.get('office'),
-                sol_data.get('full_parent_path'),
-                sol_data.get('naics_code'),
-                sol_data.get('naics_description'),
-                sol_data.get('psc_code'),
-                sol_data.get('set_aside'),
-                sol_data.get('type_of_notice'),
-                sol_data.get('posted_date'),
-                sol_data.get('response_deadline'),
-                sol_data.get('archive_date'),
-                sol_data.get('estimated_value_low'),
-                sol_data.get('estimated_value_high'),
-                sol_data.get('place_of_performance_city'),
-                sol_data.get('place_of_performance_state'),
-                sol_data.get('place_of_performance_zip'),
-                sol_data.get('place_of_performance_country'),
-                sol_data.get('primary_contact_name'),
-                sol_data.get('primary_contact_email'),
-                sol_data.get('primary_contact_phone'),
-                sol_data.get('url'),
-                sol_data.get('data_source', 'SAM.gov API'),
-                datetime.now().isoformat(),
-                datetime.now().isoformat()
-            ))
-            
-            self.conn.commit()
-            return cursor.lastrowid
+            with self.transaction():
+                self._record_naics([(sol_data.get('naics_code'), sol_data.get('naics_description'))])
+                cursor.execute(_SOL_UPSERT_SQL + ' RETURNING id', _solicitation_row(sol_data))
+                row = cursor.fetchone()
+                if row is None:
+                    # Unchanged duplicate: the guarded UPDATE was skipped
+                    row = cursor.execute('SELECT id FROM solicitations WHERE notice_id = ?',
+                                         (sol_data['notice_id'],)).fetchone()
+                cursor.execute(_BODY_UPSERT_SQL, (sol_data.get('description'), sol_data['notice_id']))
+            return row[0]
             
         except Exception as e:
             print(f"Error inserting solicitation: {e}")
-            self.conn.rollback()
+            self._naics_known.clear()
+            return None
+
+    def insert_solicitations_bulk(self, rows: list) -> Optional[int]:
+        """
+        Insert or update many solicitations in a single transaction.
+
+        Args:
+            rows: List of solicitation dicts (same keys as insert_solicitation)
+
+        Returns:
+            Number of newly inserted rows (the rest were updates), None on error
+        """
+        return self._upsert_many(
+            [_solicitation_row(r) for r in rows],
+            [(r.get('naics_code'), r.get('naics_description')) for r in rows],
+            [(r.get('description'), r['notice_id']) for r in rows],
+        )
+
+    def insert_from_sam(self, sol_objs: list, notice_type: str) -> Optional[int]:
+        """
+        Insert or update SAM.gov Opportunity objects without building dicts.
+
+        Args:
+            sol_objs: Opportunity objects from SAMApiClient
+            notice_type: Notice type the objects were fetched for
+
+        Returns:
+            Number of newly inserted rows, None on error
+        """
+        return self._upsert_many(
+            [_sam_row(o, notice_type) for o in sol_objs],
+            [(o.naics_code, o.naics_description) for o in sol_objs],
+            [(o.description, o.notice_id) for o in sol_objs],
+        )
+
+    def _upsert_many(self, rows: list, naics_pairs: list, bodies: list) -> Optional[int]:
+        """Run the solicitation and body UPSERTs over parameter tuples in one transaction."""
+        cursor = self._cursor
+
+        try:
+            with self.transaction():
+                self._record_naics(naics_pairs)
+                # AUTOINCREMENT ids only grow, so anything above the old max is new
+                max_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM solicitations').fetchone()[0]
+                cursor.executemany(_SOL_UPSERT_SQL, rows)
+                cursor.executemany(_BODY_UPSERT_SQL, bodies)
+                new_rows = cursor.execute(
+                    'SELECT COUNT(*) FROM solicitations WHERE id > ?', (max_id,)
+                ).fetchone()[0]
+            return new_rows
+
+        except Exception as e:
+            print(f"Error inserting solicitations: {e}")
+            self._naics_known.clear()
             return None
     
     def get_agency_stats(self, agency_name: str) -> dict:
         """Get statistics for a specific agency."""
-        cursor = self.conn.cursor()
+        with self.reader() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_opps,
-                COUNT(CASE WHEN is_small_business_setaside = 1 THEN 1 END) as small_biz_opps,
-                AVG(estimated_value_high) as avg_value,
-                MIN(posted_date) as first_seen,
-                MAX(posted_date) as last_activity
-            FROM solicitations
-            WHERE department = ?
-        ''', (agency_name,))
+            cursor.execute('''
+                SELECT 
+                    COUNT(*) as total_opps,
+                    COUNT(CASE WHEN is_small_business_setaside = 1 THEN 1 END) as small_biz_opps,
+                    AVG(estimated_value_high) / 100.0 as avg_value,
+                    MIN(posted_date) as first_seen,
+                    MAX(posted_date) as last_activity
+                FROM solicitations
+                WHERE department = ?
+            ''', (agency_name,))
         
-        return dict(cursor.fetchone())
+            return dict(cursor.fetchone())
     
     def get_naics_stats(self, naics_code: str) -> dict:
         """Get statistics for a specific NAICS code."""
-        cursor = self.conn.cursor()
+        with self.reader() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_opps,
-                AVG(estimated_value_high) as avg_value,
-                department as top_agency,
-                COUNT(CASE WHEN is_small_business_setaside = 1 THEN 1 END) * 100.0 / COUNT(*) as small_biz_percentage
-            FROM solicitations
-            WHERE naics_code LIKE ?
-            GROUP BY department
-            ORDER BY COUNT(*) DESC
-            LIMIT 1
-        ''', (f'{naics_code}%',))
+            cursor.execute('''
+                SELECT 
+                    COUNT(*) as total_opps,
+                    AVG(estimated_value_high) / 100.0 as avg_value,
+                    department as top_agency,
+                    COUNT(CASE WHEN is_small_business_setaside = 1 THEN 1 END) * 100.0 / COUNT(*) as small_biz_percentage
+                FROM solicitations
+                WHERE naics_code GLOB ?
+                GROUP BY department
+                ORDER BY COUNT(*) DESC
+                LIMIT 1
+            ''', (f'{naics_code}*',))
         
-        row = cursor.fetchone()
-        return dict(row) if row else {}
+            row = cursor.fetchone()
+            return dict(row) if row else {}
     
+    def search_solicitations(self, query: str, limit: int = 50) -> list:
+        """Full-text search over solicitation titles and descriptions.
+
+        *query* uses FTS5 syntax (e.g. ``cyber*``, ``"help desk" OR helpdesk``).
+        Results are ordered by relevance.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT s.*, b.description
+            FROM solicitations_fts f
+            JOIN solicitations s ON s.id = f.rowid
+            LEFT JOIN solicitation_bodies b ON b.solicitation_id = s.id
+            WHERE solicitations_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (query, limit))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def search_sow_analysis(self, query: str, limit: int = 50) -> list:
+        """Full-text search over SOW scope summaries, ordered by relevance."""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT sa.*
+            FROM sow_analysis_fts f
+            JOIN sow_analysis sa ON sa.id = f.rowid
+            WHERE sow_analysis_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (query, limit))
+        return [dict(row) for row in cursor.fetchall()]
+
     def get_trends(self, days: int = 30) -> list:
         """Get trend data for the past N days."""
-        cursor = self.conn.cursor()
+        # Plain ISO-string bounds keep this an idx_posted_date range scan;
+        # posted_date starts with YYYY-MM-DD, so substr() gives the day.
+        today = datetime.now()
+        start = (today - timedelta(days=days)).strftime('%Y-%m-%d')
+        end = (today + timedelta(days=1)).strftime('%Y-%m-%d')
+        with self.reader() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT 
-                DATE(posted_date) as date,
-                COUNT(*) as count,
-                COUNT(CASE WHEN is_small_business_setaside = 1 THEN 1 END) as small_biz_count
-            FROM solicitations
-            WHERE posted_date >= date('now', '-' || ? || ' days')
-            GROUP BY DATE(posted_date)
-            ORDER BY date
-        ''', (days,))
+            cursor.execute('''
+                SELECT 
+                    substr(posted_date, 1, 10) as date,
+                    COUNT(*) as count,
+                    COUNT(CASE WHEN is_small_business_setaside = 1 THEN 1 END) as small_biz_count
+                FROM solicitations
+                WHERE posted_date >= ? AND posted_date < ?
+                GROUP BY date
+                ORDER BY date
+            ''', (start, end))
         
-        return [dict(row) for row in cursor.fetchall()]
+            return [dict(row) for row in cursor.fetchall()]
     
+    def checkpoint(self):
+        """Copy the WAL back into the database file and truncate it.
+
+        Long collection runs call this before closing so the -wal file
+        does not keep its peak size on disk.
+        """
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
     def close(self):
-        """Close database connection."""
+        """Refresh planner statistics and close database connections."""
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+        self.conn.execute('PRAGMA optimize')
         self.conn.close()
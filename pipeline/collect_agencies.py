@@ -10,10 +10,11 @@ import os
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 import config
-from sam_api import SAMApiClient
+from sam_api import RateLimiter, SAMApiClient
 from database import ProcurementDatabase
 from datetime import datetime, timedelta
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Agencies to collect, with keywords and full names for matching
 AGENCIES = [
@@ -53,6 +54,57 @@ NOTICE_TYPES = [
 ]
 
 
+def _agency_matcher(agency: dict):
+    """Return a predicate telling whether an Opportunity belongs to *agency*.
+
+    Needles are uppercased once here rather than per opportunity, and each
+    opportunity's department is uppercased once for both department checks.
+    """
+    full_name = agency["full_name"]
+    label = agency["label"].upper()
+
+    def is_match(o) -> bool:
+        dept = (o.department or "").upper()
+        if full_name in dept or label in dept:
+            return True
+        return full_name in f"{o.sub_tier or ''}\n{o.office or ''}".upper()
+
+    return is_match
+
+
+def _fetch_matches(client: SAMApiClient, limiter: RateLimiter, agency: dict,
+                   notice_type: str, from_d: str, to_d: str, max_retries: int = 3) -> list:
+    """Fetch one agency/notice-type/date-range slice and keep confirmed matches.
+
+    Runs on a worker thread; every attempt first takes a token from *limiter*.
+    Returns an empty list if every attempt fails.
+    """
+    is_match = _agency_matcher(agency)
+    for attempt in range(max_retries):
+        limiter.acquire()
+        try:
+            opps = client.get_opportunities_paginated(
+                max_results=5000,
+                page_size=100,
+                posted_from=from_d,
+                posted_to=to_d,
+                notice_type=notice_type,
+                keyword=agency["keyword"],
+            )
+            # Filter to confirm agency match (keyword search may return broader results)
+            return [o for o in opps if is_match(o)]
+
+        except Exception as e:
+            if "429" in str(e) and attempt < max_retries - 1:
+                wait = 10 * (attempt + 1)
+                print(f"    RATE LIMITED ({agency['label']}, {notice_type}, {from_d}) — waiting {wait}s (retry {attempt + 1}/{max_retries})")
+                time.sleep(wait)
+            else:
+                print(f"    ERROR ({agency['label']}, {notice_type}, {from_d}): {e}")
+                time.sleep(5)
+    return []
+
+
 def collect_agency_opportunities(days_back: int = 365):
     """Pull opportunities for each target agency using keyword search."""
     print("=" * 80)
@@ -86,74 +138,39 @@ def collect_agency_opportunities(days_back: int = 365):
 
     grand_total = 0
 
-    for agency in AGENCIES:
-        print(f"\n{'─' * 60}")
-        print(f"  {agency['label']} - {agency['full_name']}")
-        print(f"{'─' * 60}")
-        agency_count = 0
-
-        for notice_type in NOTICE_TYPES:
-            for from_d, to_d in date_ranges:
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        opps = client.get_opportunities_paginated(
-                            max_results=5000,
-                            page_size=100,
-                            posted_from=from_d,
-                            posted_to=to_d,
-                            notice_type=notice_type,
-                            keyword=agency["keyword"],
-                        )
-
-                        # Filter to confirm agency match (keyword search may return broader results)
-                        matched = [
-                            o for o in opps
-                            if agency["full_name"] in (o.department or "").upper()
-                            or agency["label"].upper() in (o.department or "").upper()
-                            or agency["full_name"] in (o.sub_tier or "").upper()
-                            or agency["full_name"] in (o.office or "").upper()
-                        ]
-
-                        for o in matched:
-                            sol = {
-                                "notice_id": o.notice_id,
-                                "solicitation_number": o.solicitation_number,
-                                "title": o.title,
-                                "description": o.description,
-                                "department": o.department,
-                                "sub_tier": o.sub_tier,
-                                "office": o.office,
-                                "naics_code": o.naics_code,
-                                "naics_description": o.naics_description,
-                                "set_aside": o.set_aside,
-                                "type_of_notice": notice_type,
-                                "posted_date": o.posted_date.isoformat() if o.posted_date else None,
-                                "response_deadline": o.response_deadline.isoformat() if o.response_deadline else None,
-                                "place_of_performance_city": o.place_of_performance,
-                                "primary_contact_name": o.primary_contact,
-                                "primary_contact_email": o.primary_contact_email,
-                                "url": o.url,
-                            }
-                            db.insert_solicitation(sol)
-                            agency_count += 1
-                            print(f"    [{notice_type[:12]:12s}] {o.title[:60]}")
-
-                        # Rate limit: pause between requests
-                        time.sleep(3)
-                        break  # success — exit retry loop
-
-                    except Exception as e:
-                        if "429" in str(e) and attempt < max_retries - 1:
-                            wait = 10 * (attempt + 1)
-                            print(f"    RATE LIMITED ({notice_type}, {from_d}) — waiting {wait}s (retry {attempt + 1}/{max_retries})")
-                            time.sleep(wait)
-                        else:
-                            print(f"    ERROR ({notice_type}, {from_d}): {e}")
-                            time.sleep(5)
-
-        print(f"  >> {agency['label']} total: {agency_count}")
-        grand_total += agency_count
+    # Fetch every (agency, notice type, date range) slice on a thread pool.
+    # Slices start 3 seconds apart (one shared token bucket) but overlap
+    # while they page through results. Results are consumed in submission
+    # order so all writes stay on this thread.
+    limiter = RateLimiter(config.SAM_SEARCH_SLICES_PER_SECOND)
+    with ThreadPoolExecutor(max_workers=config.MAX_CONCURRENT_REQUESTS) as pool:
+        jobs = {
+            agency["label"]: [
+                (notice_type, pool.submit(_fetch_matches, client, limiter, agency,
+                                          notice_type, from_d, to_d))
+                for notice_type in NOTICE_TYPES
+                for from_d, to_d in date_ranges
+            ]
+            for agency in AGENCIES
+        }
+
+        for agency in AGENCIES:
+            print(f"\n{'─' * 60}")
+            print(f"  {agency['label']} - {agency['full_name']}")
+            print(f"{'─' * 60}")
+            agency_count = 0
+
+            for notice_type, future in jobs[agency["label"]]:
+                matched = future.result()
+                if not matched:
+                    continue
+                for o in matched:
+                    print(f"    [{notice_type[:12]:12s}] {o.title[:60]}")
+                if db.insert_from_sam(matched, notice_type) is not None:
+                    agency_count += len(matched)
+
+            print(f"  >> {agency['label']} total: {agency_count}")
+            grand_total += agency_count
 
     # Log the collection
     cursor = db.conn.cursor()
@@ -171,16 +188,22 @@ def collect_agency_opportunities(days_back: int = 365):
     print("COLLECTION SUMMARY")
     print("=" * 80)
     print(f"Total opportunities saved: {grand_total}")
+    # One pass over the covering idx_department index, then match the handful
+    # of distinct department names in Python
+    with db.reader() as conn:
+        dept_counts = [
+            ((row[0] or "").upper(), row[1])
+            for row in conn.execute(
+                "SELECT department, COUNT(*) FROM solicitations GROUP BY department"
+            )
+        ]
     for agency in AGENCIES:
-        cursor.execute(
-            "SELECT COUNT(*) FROM solicitations WHERE UPPER(department) LIKE ?",
-            (f"%{agency['full_name']}%",),
-        )
-        count = cursor.fetchone()[0]
+        count = sum(n for dept, n in dept_counts if agency["full_name"] in dept)
         print(f"  {agency['label']:6s}: {count} in database")
 
-    cursor.execute("SELECT COUNT(*) FROM solicitations")
-    print(f"\nTotal opportunities in database: {cursor.fetchone()[0]}")
+    print(f"\nTotal opportunities in database: {sum(n for _, n in dept_counts)}")
+    db.verify_plans()
+    db.checkpoint()
     db.close()
     print("Done!")
 
@@ -4,7 +4,9 @@ Run this daily to build historical database.
 """
 
 import os
+import queue
 import sys
+import threading
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 import config
 from sam_api import SAMApiClient
@@ -13,12 +15,41 @@ from datetime import datetime, timedelta
 import time
 
 
-def collect_all_opportunities(days_back: int = 7):
+def _prefetch(pages, depth: int = 2):
+    """Iterate *pages* on a background thread, buffering up to *depth* items.
+
+    Lets the next API page download while the caller writes the current one
+    to SQLite. Exceptions from the producer are re-raised in the caller.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    done = object()
+
+    def produce():
+        try:
+            for page in pages:
+                buffer.put(page)
+        except Exception as e:
+            buffer.put(e)
+        finally:
+            buffer.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is done:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def collect_all_opportunities(days_back: int = 7, db: ProcurementDatabase = None):
     """
     Collect all solicitations from the past N days.
     
     Args:
         days_back: Number of days to look back
+        db: Open database to write to; one is opened (and closed) if omitted
     """
     print("=" * 80)
     print(f"Federal Procurement Data Collection - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
@@ -28,7 +59,9 @@ def collect_all_opportunities(days_back: int = 7):
     # Initialize
     config.validate_config()
     api_client = SAMApiClient()
-    db = ProcurementDatabase()
+    owns_db = db is None
+    if owns_db:
+        db = ProcurementDatabase()
     
     # Calculate date range
     end_date = datetime.now()
@@ -56,49 +89,27 @@ def collect_all_opportunities(days_back: int = 7):
         print(f"\nCollecting {notice_type}...")
         
         try:
-            # Use pagination to get all results
-            response = api_client.get_opportunities_paginated(
+            # Store each page as it arrives while the next one is fetched
+            pages = _prefetch(api_client.iter_opportunities_paginated(
                 max_results=5000,
                 page_size=100,
                 posted_from=start_date.strftime('%Y-%m-%d'),
                 posted_to=end_date.strftime('%Y-%m-%d'),
                 notice_type=notice_type
-            )
-            
-            print(f"  Found {len(response)} {notice_type} opportunities")
+            ))
             
-            # Store each in database
-            for sol in response:
-                sol_data = {
-                    'notice_id': sol.notice_id,
-                    'solicitation_number': sol.solicitation_number,
-                    'title': sol.title,
-                    'description': sol.description,
-                    'department': sol.department,
-                    'sub_tier': sol.sub_tier,
-                    'office': sol.office,
-                    'naics_code': sol.naics_code,
-                    'naics_description': sol.naics_description,
-                    'set_aside': sol.set_aside,
-                    'type_of_notice': notice_type,
-                    'posted_date': sol.posted_date.isoformat() if sol.posted_date else None,
-                    'response_deadline': sol.response_deadline.isoformat() if sol.response_deadline else None,
-                    'place_of_performance_city': sol.place_of_performance,
-                    'primary_contact_name': sol.primary_contact,
-                    'primary_contact_email': sol.primary_contact_email,
-                    'url': sol.url,
-                }
-                
-                row_id = db.insert_solicitation(sol_data)
-                if row_id:
-                    new_records += 1
+            found = 0
+            for page in pages:
+                found += len(page)
+                inserted = db.insert_from_sam(page, notice_type)
+                if inserted is None:
+                    errors += 1
                 else:
-                    updated_records += 1
-                
-                total_collected += 1
+                    new_records += inserted
+                    updated_records += len(page) - inserted
+                    total_collected += len(page)
             
-            # Be nice to the API
-            time.sleep(1)
+            print(f"  Found {found} {notice_type} opportunities")
             
         except Exception as e:
             print(f"  Error collecting {notice_type}: {e}")
@@ -131,12 +142,15 @@ def collect_all_opportunities(days_back: int = 7):
     print(f"Errors: {errors}")
     print()
     
-    # Quick stats
-    cursor.execute('SELECT COUNT(*) as total FROM solicitations')
-    total_in_db = cursor.fetchone()[0]
+    # Quick stats, read from a WAL snapshot so they never wait on the writer
+    with db.reader() as conn:
+        total_in_db = conn.execute('SELECT COUNT(*) as total FROM solicitations').fetchone()[0]
     print(f"Total opportunities in database: {total_in_db}")
     
-    db.close()
+    if owns_db:
+        db.verify_plans()
+        db.checkpoint()
+        db.close()
     
     print()
     print("Collection complete!")
@@ -159,17 +173,28 @@ def initial_backfill(days: int = 90):
     print("This will take a while - be patient!")
     print()
     
-    # Collect in chunks to avoid overwhelming the API
-    chunk_size = 30
-    for i in range(0, days, chunk_size):
-        chunk_days = min(chunk_size, days - i)
-        print(f"\nCollecting days {i+1} to {i+chunk_days}...")
-        collect_all_opportunities(days_back=chunk_days)
-        
-        # Longer pause between chunks
-        if i + chunk_size < days:
-            print("\nPausing 30 seconds before next chunk...")
-            time.sleep(30)
+    # Load without secondary indexes and build them once at the end
+    db = ProcurementDatabase()
+    db.drop_indexes()
+    
+    try:
+        # Collect in chunks to avoid overwhelming the API
+        chunk_size = 30
+        for i in range(0, days, chunk_size):
+            chunk_days = min(chunk_size, days - i)
+            print(f"\nCollecting days {i+1} to {i+chunk_days}...")
+            collect_all_opportunities(days_back=chunk_days, db=db)
+            
+            # Longer pause between chunks
+            if i + chunk_size < days:
+                print("\nPausing 30 seconds before next chunk...")
+                time.sleep(30)
+    finally:
+        print("\nRebuilding indexes...")
+        db.create_indexes()
+        db.verify_plans()
+        db.checkpoint()
+        db.close()
     
     print()
     print("Initial backfill complete!")
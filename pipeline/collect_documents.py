@@ -11,10 +11,12 @@ Usage:
 """
 
 import argparse
+import logging
 import os
 import sys
-import time
-from datetime import datetime
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'analysis'))
@@ -26,256 +28,314 @@ from doc_parser import (
     build_sow_analysis, extract_evaluation_factors,
 )
 
-RATE_LIMIT_DELAY = 2  # seconds between API calls
+logger = logging.getLogger(__name__)
 
 
-def get_solicitation_id(db, notice_id: str):
-    """Look up the solicitations table id for a notice_id."""
-    cursor = db.conn.cursor()
-    cursor.execute("SELECT id FROM solicitations WHERE notice_id = ?", (notice_id,))
-    row = cursor.fetchone()
-    return row["id"] if row else None
+# File types recorded for known attachment extensions; anything else is
+# recorded by its bare extension
+_EXT_MAP = {".pdf": "pdf", ".docx": "docx", ".doc": "doc"}
 
+# PDF/DOCX parsing is CPU-bound, so it runs in worker processes. Created on
+# first use and shut down by main().
+_extract_pool = None
 
-def store_document(db, doc: dict):
-    """Insert a document record and return its id."""
-    cursor = db.conn.cursor()
+
+def _get_extract_pool() -> ProcessPoolExecutor:
+    """Return the shared text-extraction process pool."""
+    global _extract_pool
+    if _extract_pool is None:
+        _extract_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _extract_pool
+
+
+def _link_target(link):
+    """Return (file_url, filename, file_type) for a resource link, or None."""
+    if isinstance(link, str):
+        file_url = link
+        filename = link.rsplit("/", 1)[-1].split("?")[0]
+    elif isinstance(link, dict):
+        file_url = link.get("url", link.get("href", ""))
+        filename = link.get("name", link.get("filename", file_url.rsplit("/", 1)[-1]))
+    else:
+        return None
+
+    if not file_url:
+        return None
+
+    ext = os.path.splitext(filename)[1].lower()
+    file_type = _EXT_MAP.get(ext) or ext.lstrip(".") or "unknown"
+    return file_url, filename, file_type
+
+
+def _download(client: SAMApiClient, db: ProcurementDatabase, file_url: str):
+    """Download one attachment to a temp file.
+
+    A file fetched before is re-requested conditionally; when the server
+    says it is unchanged, no file is written and the stored digest is kept.
+    Returns (path or None, sha256 digest, etag, last_modified), or the
+    exception instead of raising it.
+    """
     try:
-        cursor.execute('''
-            INSERT OR IGNORE INTO opportunity_documents
-                (solicitation_id, notice_id, filename, file_url, file_type,
-                 doc_role, raw_text, description_html,
-                 download_status, parse_status, error_message,
-                 created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            doc.get("solicitation_id"),
-            doc["notice_id"],
-            doc.get("filename", ""),
-            doc["file_url"],
-            doc.get("file_type", ""),
-            doc.get("doc_role", "unknown"),
-            doc.get("raw_text", ""),
-            doc.get("description_html", ""),
-            doc.get("download_status", "complete"),
-            doc.get("parse_status", "complete"),
-            doc.get("error_message", ""),
-            datetime.now().isoformat(),
-            datetime.now().isoformat(),
-        ))
-        db.conn.commit()
-        return cursor.lastrowid if cursor.lastrowid else None
+        etag, last_modified, stored_digest = db.get_document_validators(file_url) or (None, None, None)
+        path, digest, etag, last_modified = client.download_attachment_to_file(
+            file_url, etag, last_modified)
     except Exception as e:
-        print(f"  Error storing document: {e}")
-        db.conn.rollback()
-        return None
+        return e
+    return path, digest or stored_digest, etag, last_modified
 
 
-def store_sow_analysis(db, analysis: dict):
-    """Insert a SOW analysis record."""
-    cursor = db.conn.cursor()
-    cursor.execute('''
-        INSERT INTO sow_analysis
-            (document_id, solicitation_id, notice_id,
-             scope_summary, period_of_performance, place_of_performance,
-             key_tasks, labor_categories, deliverables,
-             compliance_reqs, ordering_mechanism, billing_instructions,
-             confidence_score, extraction_method, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        analysis["document_id"], analysis["solicitation_id"], analysis["notice_id"],
-        analysis["scope_summary"], analysis["period_of_performance"],
-        analysis["place_of_performance"],
-        analysis["key_tasks"], analysis["labor_categories"], analysis["deliverables"],
-        analysis["compliance_reqs"], analysis["ordering_mechanism"],
-        analysis["billing_instructions"],
-        analysis["confidence_score"], analysis["extraction_method"],
-        analysis["created_at"],
-    ))
-    db.conn.commit()
-
-
-def store_eval_factors(db, factors):
-    """Insert evaluation criteria records."""
-    cursor = db.conn.cursor()
-    for f in factors:
-        cursor.execute('''
-            INSERT INTO evaluation_criteria
-                (document_id, solicitation_id, notice_id,
-                 evaluation_phase, factor_number, factor_name, factor_weight,
-                 subfactors, description, page_limit, rating_method, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            f["document_id"], f["solicitation_id"], f["notice_id"],
-            f["evaluation_phase"], f["factor_number"], f["factor_name"],
-            f["factor_weight"], f["subfactors"], f["description"],
-            f["page_limit"], f["rating_method"], f["created_at"],
-        ))
-    db.conn.commit()
+def _fetch_all_links(client: SAMApiClient, db: ProcurementDatabase, targets: list) -> list:
+    """Download every (file_url, filename, file_type) target concurrently.
 
+    Requests are paced by the client's shared rate limiter. Returns
+    _download()'s result for each target, in order; the caller deletes
+    the files.
+    """
+    with ThreadPoolExecutor(max_workers=config.MAX_CONCURRENT_DOWNLOADS) as pool:
+        return list(pool.map(lambda t: _download(client, db, t[0]), targets))
 
-def process_notice(client: SAMApiClient, db: ProcurementDatabase, notice_id: str):
-    """Download and parse all documents for a single notice."""
-    print(f"\nProcessing notice: {notice_id}")
-    sol_id = get_solicitation_id(db, notice_id)
 
+def process_notice(client: SAMApiClient, db: ProcurementDatabase, notice_id: str):
+    """Download and parse all documents for a single notice.
+
+    Network and parsing work happens first; everything found is then
+    written in one transaction, so a notice costs a single commit.
+    """
+    _store_notice(db, notice_id, db.get_solicitation_id(notice_id),
+                  _fetch_notice(client, db, notice_id))
+
+
+def _process_notices(client: SAMApiClient, db: ProcurementDatabase, notices: list):
+    """Process many (solicitation id, notice_id) rows, fetching several at once.
+
+    Fetching and parsing run on a thread pool (requests are paced by the
+    client's shared rate limiter); results are stored on this thread in
+    notice order. At most two notices per worker are in flight, so finished
+    ones don't pile up in memory waiting to be stored.
+    """
+    workers = config.MAX_CONCURRENT_REQUESTS
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for sol_id, nid in notices:
+            pending.append((sol_id, nid, pool.submit(_fetch_notice, client, db, nid)))
+            if len(pending) >= 2 * workers:
+                _store_ready(db, pending)
+        while pending:
+            _store_ready(db, pending)
+
+
+def _store_ready(db: ProcurementDatabase, pending: deque):
+    """Wait for the oldest pending notice, then store it and every finished one after it.
+
+    They share one transaction, so a burst of finished notices costs a
+    single commit. The write lock is only taken once the results are in
+    hand, never while waiting on the network. A notice that failed to
+    fetch or store is logged and skipped; _store_notice() runs as a
+    savepoint, so its partial writes are rolled back without the others'.
+    """
+    pending[0][2].exception()  # wait without raising
+    with db.transaction():
+        while pending and pending[0][2].done():
+            sol_id, nid, future = pending.popleft()
+            try:
+                _store_notice(db, nid, sol_id, future.result())
+            except Exception as e:
+                logger.error("  Error processing %s: %s", nid, e)
+
+
+def _fetch_notice(client: SAMApiClient, db: ProcurementDatabase, notice_id: str) -> dict:
+    """Fetch and parse a notice's description and attachments without writing anything.
+
+    Safe to run on a worker thread: the only DB access is the validator and
+    content-hash lookups, which use pooled read-only connections.
+    """
     # 1. Fetch description HTML
-    print("  Fetching description HTML...")
+    html = desc_text = None
     try:
         html = client.get_description_html(notice_id)
         if html:
-            text = extract_text("description.html", html)
-            role = classify_document("description.html", text)
-            doc_id = store_document(db, {
-                "solicitation_id": sol_id,
-                "notice_id": notice_id,
-                "filename": "description.html",
-                "file_url": f"noticedesc:{notice_id}",
-                "file_type": "html",
-                "doc_role": role,
-                "raw_text": text,
-                "description_html": html,
-            })
-            if doc_id:
-                _run_analysis(db, doc_id, sol_id, notice_id, role, text)
-                print(f"  Description stored (role={role}, {len(text)} chars)")
+            desc_text = extract_text("description.html", html)
     except Exception as e:
-        print(f"  Error fetching description: {e}")
-
-    time.sleep(RATE_LIMIT_DELAY)
+        logger.error("  [%s] Error fetching description: %s", notice_id, e)
 
     # 2. Fetch resource links
-    print("  Fetching resource links...")
     try:
         links = client.get_resource_links(notice_id)
     except Exception as e:
-        print(f"  Error fetching resource links: {e}")
+        logger.error("  [%s] Error fetching resource links: %s", notice_id, e)
         links = []
 
-    if not links:
-        print("  No resource links found.")
-        return
-
-    print(f"  Found {len(links)} resource link(s)")
-
-    for link in links:
-        time.sleep(RATE_LIMIT_DELAY)
-
-        if isinstance(link, str):
-            file_url = link
-            filename = link.rsplit("/", 1)[-1].split("?")[0]
-        elif isinstance(link, dict):
-            file_url = link.get("url", link.get("href", ""))
-            filename = link.get("name", link.get("filename", file_url.rsplit("/", 1)[-1]))
-        else:
-            continue
-
-        if not file_url:
-            continue
-
-        # Determine file type
-        lower_name = filename.lower()
-        if lower_name.endswith(".pdf"):
-            file_type = "pdf"
-        elif lower_name.endswith(".docx"):
-            file_type = "docx"
-        elif lower_name.endswith(".doc"):
-            file_type = "doc"
-        else:
-            file_type = lower_name.rsplit(".", 1)[-1] if "." in lower_name else "unknown"
-
-        print(f"  Downloading: {filename} ({file_type})...")
-
-        try:
-            content = client.download_attachment(file_url)
-            text = extract_text(filename, content)
-            role = classify_document(filename, text)
-
-            doc_id = store_document(db, {
-                "solicitation_id": sol_id,
-                "notice_id": notice_id,
-                "filename": filename,
-                "file_url": file_url,
-                "file_type": file_type,
-                "doc_role": role,
-                "raw_text": text,
-            })
-
-            if doc_id:
-                _run_analysis(db, doc_id, sol_id, notice_id, role, text)
-                print(f"    Stored: role={role}, {len(text)} chars")
-
-        except Exception as e:
-            store_document(db, {
+    targets = [t for t in map(_link_target, links) if t]
+    downloads = _fetch_all_links(client, db, targets)
+
+    # Files already parsed (for another notice, or unchanged since the last
+    # run) reuse that text and role. The rest are parsed in parallel, with
+    # workers reading the temp files directly rather than being sent the
+    # bytes. Each entry ends up as (content digest, role or None, text or
+    # exception), in link order.
+    pool = _get_extract_pool()
+    parsed = []
+    validators = []
+    try:
+        for (_, filename, _), download in zip(targets, downloads):
+            if isinstance(download, Exception):
+                parsed.append((None, None, download))
+                validators.append((None, None))
+                continue
+            path, digest, etag, last_modified = download
+            validators.append((etag, last_modified))
+            cached = db.find_document_text(digest)
+            if cached:
+                parsed.append((digest, cached[0], cached[1]))
+            elif path is None:
+                parsed.append((digest, None, RuntimeError("not modified, but no parsed copy is stored")))
+            else:
+                parsed.append((digest, None, pool.submit(extract_text, filename, path)))
+        for i, (digest, role, text) in enumerate(parsed):
+            if isinstance(text, Future):
+                try:
+                    parsed[i] = (digest, role, text.result())
+                except Exception as e:
+                    parsed[i] = (digest, role, e)
+    finally:
+        for download in downloads:
+            if not isinstance(download, Exception) and download[0] is not None:
+                download[0].unlink(missing_ok=True)
+
+    return {
+        "html": html,
+        "desc_text": desc_text,
+        "link_count": len(links),
+        "targets": targets,
+        "parsed": parsed,
+        "validators": validators,
+    }
+
+
+def _store_notice(db: ProcurementDatabase, notice_id: str, sol_id: Optional[int], fetched: dict):
+    """Store a fetched notice's documents and analysis in one transaction.
+
+    Inside an enclosing transaction this is a savepoint instead. Each
+    document gets its own savepoint too, so one that fails to classify or
+    analyze is rolled back alone (attachments are recorded as errors)
+    without losing the rest of the notice.
+    """
+    logger.info("\nProcessing notice: %s", notice_id)
+    desc_text = fetched["desc_text"]
+
+    if fetched["link_count"]:
+        logger.info("  Found %d resource link(s)", fetched["link_count"])
+    else:
+        logger.info("  No resource links found.")
+
+    with db.transaction():
+        if desc_text is not None:
+            try:
+                with db.transaction():
+                    role = classify_document("description.html", desc_text)
+                    doc_id, created = db.insert_document({
+                        "solicitation_id": sol_id,
+                        "notice_id": notice_id,
+                        "filename": "description.html",
+                        "file_url": f"noticedesc:{notice_id}",
+                        "file_type": "html",
+                        "doc_role": role,
+                        "raw_text": desc_text,
+                        "description_html": fetched["html"],
+                    }) or (None, False)
+                    if created:
+                        _run_analysis(db, doc_id, sol_id, notice_id, role, desc_text)
+                        logger.info("  Description stored (role=%s, %d chars)", role, len(desc_text))
+            except Exception as e:
+                logger.error("  Error storing description: %s", e)
+
+        entries = zip(fetched["targets"], fetched["parsed"], fetched["validators"])
+        for (file_url, filename, file_type), (digest, role, text), (etag, last_modified) in entries:
+            logger.info("  Parsed: %s (%s)%s", filename, file_type, " [cached]" if role else "")
+
+            if not isinstance(text, Exception):
+                try:
+                    with db.transaction():
+                        role = role or classify_document(filename, text)
+                        doc_id, created = db.insert_document({
+                            "solicitation_id": sol_id,
+                            "notice_id": notice_id,
+                            "filename": filename,
+                            "file_url": file_url,
+                            "file_type": file_type,
+                            "content_sha256": digest,
+                            "etag": etag,
+                            "last_modified": last_modified,
+                            "doc_role": role,
+                            "raw_text": text,
+                        }) or (None, False)
+                        if created:
+                            _run_analysis(db, doc_id, sol_id, notice_id, role, text)
+                            logger.info("    Stored: role=%s, %d chars", role, len(text))
+                    continue
+                except Exception as e:
+                    text = e
+
+            db.insert_document({
                 "solicitation_id": sol_id,
                 "notice_id": notice_id,
                 "filename": filename,
                 "file_url": file_url,
                 "file_type": file_type,
+                "content_sha256": digest,
                 "download_status": "error",
                 "parse_status": "error",
-                "error_message": str(e),
+                "error_message": str(text),
             })
-            print(f"    Error: {e}")
+            logger.error("    Error: %s", text)
 
 
 def _run_analysis(db, doc_id, sol_id, notice_id, role, text):
     """Run appropriate analysis based on document role."""
-    if role in ("sow", "pws"):
+    # Solicitations often contain SOW content too, so they share one pass
+    if role in ("sow", "pws", "solicitation"):
         analysis = build_sow_analysis(doc_id, sol_id, notice_id, text)
-        store_sow_analysis(db, analysis)
+        if role != "solicitation":
+            db.insert_sow_analysis(analysis)
+        # build_sow_analysis() serializes empty findings as "[]"
+        elif analysis["labor_categories"] != "[]" or analysis["key_tasks"] != "[]":
+            db.insert_sow_analysis(analysis)
+            logger.info("    Also extracted SOW data from solicitation")
 
     if role in ("solicitation", "evaluation_criteria"):
         factors = extract_evaluation_factors(doc_id, sol_id, notice_id, text)
         if factors:
-            store_eval_factors(db, factors)
-            print(f"    Extracted {len(factors)} evaluation factors")
-
-    # For solicitations, also try SOW extraction (they often contain both)
-    if role == "solicitation":
-        analysis = build_sow_analysis(doc_id, sol_id, notice_id, text)
-        import json
-        if json.loads(analysis["labor_categories"]) or json.loads(analysis["key_tasks"]):
-            store_sow_analysis(db, analysis)
-            print(f"    Also extracted SOW data from solicitation")
+            db.insert_eval_factors(factors)
+            logger.info("    Extracted %d evaluation factors", len(factors))
 
 
 def collect_for_agency(client: SAMApiClient, db: ProcurementDatabase, agency: str):
-    """Process all stored notices for an agency."""
+    """Process all stored notices for an agency that haven't been processed yet."""
     cursor = db.conn.cursor()
-    cursor.execute(
-        "SELECT notice_id FROM solicitations WHERE department LIKE ?",
-        (f"%{agency}%",)
-    )
-    notice_ids = [row["notice_id"] for row in cursor.fetchall()]
-    print(f"Found {len(notice_ids)} notices for {agency}")
-
-    for nid in notice_ids:
-        # Skip already-processed notices
-        cursor.execute(
-            "SELECT COUNT(*) as cnt FROM opportunity_documents WHERE notice_id = ?",
-            (nid,)
-        )
-        if cursor.fetchone()["cnt"] > 0:
-            print(f"  Skipping {nid} (already processed)")
-            continue
-        process_notice(client, db, nid)
+    cursor.execute('''
+        SELECT s.id, s.notice_id FROM solicitations s
+        LEFT JOIN opportunity_documents d ON s.notice_id = d.notice_id
+        WHERE s.department LIKE ? AND d.id IS NULL
+    ''', (f"%{agency}%",))
+    notices = cursor.fetchall()
+    logger.info("Found %d unprocessed notices for %s", len(notices), agency)
+
+    _process_notices(client, db, notices)
 
 
 def collect_all(client: SAMApiClient, db: ProcurementDatabase):
     """Process all stored notices that haven't been processed yet."""
     cursor = db.conn.cursor()
     cursor.execute('''
-        SELECT s.notice_id FROM solicitations s
+        SELECT s.id, s.notice_id FROM solicitations s
         LEFT JOIN opportunity_documents d ON s.notice_id = d.notice_id
         WHERE d.id IS NULL
         ORDER BY s.posted_date DESC
     ''')
-    notice_ids = [row["notice_id"] for row in cursor.fetchall()]
-    print(f"Found {len(notice_ids)} unprocessed notices")
+    notices = cursor.fetchall()
+    logger.info("Found %d unprocessed notices", len(notices))
 
-    for nid in notice_ids:
-        process_notice(client, db, nid)
+    _process_notices(client, db, notices)
 
 
 def main():
@@ -285,6 +345,7 @@ def main():
     group.add_argument("--agency", help="Process all notices for an agency")
     group.add_argument("--all", action="store_true", help="Process all unprocessed notices")
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
     config.validate_config()
     client = SAMApiClient()
@@ -298,9 +359,11 @@ def main():
         elif args.all:
             collect_all(client, db)
     finally:
+        if _extract_pool is not None:
+            _extract_pool.shutdown()
         db.close()
 
-    print("\nDone.")
+    logger.info("\nDone.")
 
 
 if __name__ == "__main__":
@@ -11,12 +11,15 @@ Usage:
 """
 
 import argparse
+import hashlib
 import os
 import re
 import sys
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'analysis'))
@@ -27,10 +30,12 @@ from doc_parser import (
     build_sow_analysis,
     extract_evaluation_factors,
 )
-import json
 
 APP_DIR = Path(__file__).resolve().parent.parent
 
+# File types picked up by find_local_files(), matched case-insensitively
+LOCAL_FILE_EXTENSIONS = (".pdf", ".docx", ".xlsx")
+
 # Files known to be invalid (HTML error pages masquerading as PDFs)
 INVALID_FILES = {
     "sec_forecast.pdf",
@@ -48,7 +53,7 @@ FORECAST_FILES = {
 }
 
 # Agency inference: filename patterns -> agency name
-AGENCY_PATTERNS = [
+AGENCY_PATTERNS = [(re.compile(pattern, re.IGNORECASE), agency) for pattern, agency in [
     (r"^FHF[-\s]", "FHFA"),
     (r"FHFA", "FHFA"),
     (r"\bSEC\b", "SEC"),
@@ -59,7 +64,7 @@ AGENCY_PATTERNS = [
     (r"2031JW", "OCC"),
     # SEC solicitation number prefix (503102...)
     (r"50310[12]", "SEC"),
-]
+]]
 
 # Text-based agency detection keywords
 AGENCY_TEXT_SIGNALS = {
@@ -69,6 +74,10 @@ AGENCY_TEXT_SIGNALS = {
     "CFPB": ["consumer financial protection bureau", "cfpb"],
     "FCA": ["farm credit administration", "fca.gov"],
 }
+# Flattened to (signal, agency) pairs in priority order for infer_agency
+_AGENCY_SIGNAL_PAIRS = tuple(
+    (signal, agency) for agency, signals in AGENCY_TEXT_SIGNALS.items() for signal in signals
+)
 
 # SEC forecast value category mapping
 VALUE_CATEGORIES = {
@@ -80,117 +89,32 @@ VALUE_CATEGORIES = {
 }
 
 
-def get_solicitation_id(db, notice_id: str):
-    """Look up the solicitations table id for a notice_id."""
-    cursor = db.conn.cursor()
-    cursor.execute("SELECT id FROM solicitations WHERE notice_id = ?", (notice_id,))
-    row = cursor.fetchone()
-    return row["id"] if row else None
-
-
-def store_document(db, doc: dict):
-    """Insert a document record and return its id."""
-    cursor = db.conn.cursor()
-    try:
-        cursor.execute('''
-            INSERT OR IGNORE INTO opportunity_documents
-                (solicitation_id, notice_id, filename, file_url, file_type,
-                 doc_role, raw_text, description_html,
-                 download_status, parse_status, error_message,
-                 created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            doc.get("solicitation_id"),
-            doc["notice_id"],
-            doc.get("filename", ""),
-            doc["file_url"],
-            doc.get("file_type", ""),
-            doc.get("doc_role", "unknown"),
-            doc.get("raw_text", ""),
-            doc.get("description_html", ""),
-            doc.get("download_status", "complete"),
-            doc.get("parse_status", "complete"),
-            doc.get("error_message", ""),
-            datetime.now().isoformat(),
-            datetime.now().isoformat(),
-        ))
-        db.conn.commit()
-        return cursor.lastrowid if cursor.lastrowid else None
-    except Exception as e:
-        print(f"  Error storing document: {e}")
-        db.conn.rollback()
-        return None
-
-
-def store_sow_analysis(db, analysis: dict):
-    """Insert a SOW analysis record."""
-    cursor = db.conn.cursor()
-    cursor.execute('''
-        INSERT INTO sow_analysis
-            (document_id, solicitation_id, notice_id,
-             scope_summary, period_of_performance, place_of_performance,
-             key_tasks, labor_categories, deliverables,
-             compliance_reqs, ordering_mechanism, billing_instructions,
-             confidence_score, extraction_method, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        analysis["document_id"], analysis["solicitation_id"], analysis["notice_id"],
-        analysis["scope_summary"], analysis["period_of_performance"],
-        analysis["place_of_performance"],
-        analysis["key_tasks"], analysis["labor_categories"], analysis["deliverables"],
-        analysis["compliance_reqs"], analysis["ordering_mechanism"],
-        analysis["billing_instructions"],
-        analysis["confidence_score"], analysis["extraction_method"],
-        analysis["created_at"],
-    ))
-    db.conn.commit()
-
-
-def store_eval_factors(db, factors):
-    """Insert evaluation criteria records."""
-    cursor = db.conn.cursor()
-    for f in factors:
-        cursor.execute('''
-            INSERT INTO evaluation_criteria
-                (document_id, solicitation_id, notice_id,
-                 evaluation_phase, factor_number, factor_name, factor_weight,
-                 subfactors, description, page_limit, rating_method, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            f["document_id"], f["solicitation_id"], f["notice_id"],
-            f["evaluation_phase"], f["factor_number"], f["factor_name"],
-            f["factor_weight"], f["subfactors"], f["description"],
-            f["page_limit"], f["rating_method"], f["created_at"],
-        ))
-    db.conn.commit()
-
-
 def run_analysis(db, doc_id, sol_id, notice_id, role, text):
     """Run appropriate analysis based on document role."""
-    if role in ("sow", "pws"):
+    # Solicitations often contain SOW content too, so they share one pass
+    if role in ("sow", "pws", "solicitation"):
         analysis = build_sow_analysis(doc_id, sol_id, notice_id, text)
-        store_sow_analysis(db, analysis)
+        if role != "solicitation":
+            db.insert_sow_analysis(analysis)
+        # build_sow_analysis() serializes empty findings as "[]"
+        elif analysis["labor_categories"] != "[]" or analysis["key_tasks"] != "[]":
+            db.insert_sow_analysis(analysis)
+            print(f"    Also extracted SOW data from solicitation")
 
     if role in ("solicitation", "evaluation_criteria"):
         factors = extract_evaluation_factors(doc_id, sol_id, notice_id, text)
         if factors:
-            store_eval_factors(db, factors)
+            db.insert_eval_factors(factors)
             print(f"    Extracted {len(factors)} evaluation factors")
 
-    # For solicitations, also try SOW extraction (they often contain both)
-    if role == "solicitation":
-        analysis = build_sow_analysis(doc_id, sol_id, notice_id, text)
-        if json.loads(analysis["labor_categories"]) or json.loads(analysis["key_tasks"]):
-            store_sow_analysis(db, analysis)
-            print(f"    Also extracted SOW data from solicitation")
-
 
 def find_local_files() -> List[Path]:
-    """Find all PDF, DOCX, and XLSX files in the app directory."""
-    files = []
-    for ext in ("*.pdf", "*.docx", "*.xlsx", "*.PDF", "*.DOCX", "*.XLSX"):
-        files.extend(APP_DIR.glob(ext))
-    return sorted(set(files))
+    """Find all PDF, DOCX, and XLSX files (any extension case) in the app directory."""
+    with os.scandir(APP_DIR) as entries:
+        return sorted(
+            APP_DIR / e.name for e in entries
+            if e.name.lower().endswith(LOCAL_FILE_EXTENSIONS) and e.is_file()
+        )
 
 
 def is_valid_pdf(file_bytes: bytes) -> bool:
@@ -198,21 +122,39 @@ def is_valid_pdf(file_bytes: bytes) -> bool:
     return file_bytes[:5] == b"%PDF-"
 
 
+def load_text(filepath: Path, require_pdf: bool = False) -> Optional[str]:
+    """Extract a PDF/DOCX file's text, or return None if it is not a real PDF.
+
+    A file is checked against the PDF header when it has a .pdf suffix or
+    *require_pdf* is set. Touches no database, so it can run in a worker
+    process.
+    """
+    if require_pdf or filepath.suffix.lower() == ".pdf":
+        with open(filepath, "rb") as f:
+            if not is_valid_pdf(f.read(5)):
+                return None
+    return extract_text(filepath.name, filepath)
+
+
+def file_sha256(filepath: Path) -> bytes:
+    """SHA-256 digest of a file's bytes, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
 def infer_agency(filename: str, text: str) -> str:
     """Infer agency from filename patterns and text content."""
     # Try filename patterns first
     for pattern, agency in AGENCY_PATTERNS:
-        if re.search(pattern, filename, re.IGNORECASE):
+        if pattern.search(filename):
             return agency
 
     # Fall back to text content analysis
     lower_text = text[:5000].lower()
-    for agency, signals in AGENCY_TEXT_SIGNALS.items():
-        for signal in signals:
-            if signal in lower_text:
-                return agency
-
-    return "UNKNOWN"
+    return next((agency for signal, agency in _AGENCY_SIGNAL_PAIRS if signal in lower_text), "UNKNOWN")
 
 
 def generate_notice_id(filename: str, agency: str) -> str:
@@ -228,6 +170,22 @@ def generate_notice_id(filename: str, agency: str) -> str:
     return f"LOCAL-{agency}-{slug}"
 
 
+def _lines_containing(text: str, needle: str) -> Iterator[str]:
+    """Yield each stripped line of *text* that contains *needle*, in order.
+
+    Jumps between occurrences with str.find rather than splitting the whole
+    text into a list of lines first.
+    """
+    pos = text.find(needle)
+    while pos != -1:
+        start = text.rfind("\n", 0, pos) + 1
+        end = text.find("\n", pos)
+        if end == -1:
+            end = len(text)
+        yield text[start:end].strip()
+        pos = text.find(needle, end)
+
+
 def parse_sec_forecast(text: str) -> List[dict]:
     """Parse SEC contracting forecast PDF into structured rows.
 
@@ -252,11 +210,12 @@ def parse_sec_forecast(text: str) -> List[dict]:
         r'([1-4])\s*$'            # Quarter
     )
 
-    for line in text.split("\n"):
-        line = line.strip()
-        if not line or '50310' not in line:
+    # Only lines with a contract number that end in a quarter digit can
+    # match; skipping the rest up front keeps the lazy groups from
+    # backtracking over them
+    for line in _lines_containing(text, '50310'):
+        if line[-1] not in "1234":
             continue
-
         m = line_pattern.match(line)
         if not m:
             continue
@@ -319,20 +278,20 @@ def _infer_agency_from_excel(wb, filename: str) -> str:
     if "SEC" in upper:
         return "SEC"
 
-    # Content-based: scan first sheet header rows
+    # Content-based: scan first sheet header rows, joined into one string
     ws = wb[wb.sheetnames[0]]
-    for row in ws.iter_rows(min_row=1, max_row=10, values_only=True):
-        text = " ".join(str(c) for c in row if c)
-        if "OCC" in text or "Comptroller of the Currency" in text:
-            return "OCC"
-        if "FHFA" in text or "Federal Housing Finance" in text:
-            return "FHFA"
-        if "SEC" in text or "Securities and Exchange" in text:
-            return "SEC"
-        if "CFPB" in text:
-            return "CFPB"
-        if "FCA" in text or "Farm Credit" in text:
-            return "FCA"
+    text = " ".join(str(c) for row in ws.iter_rows(min_row=1, max_row=10, values_only=True)
+                    for c in row if c)
+    if "OCC" in text or "Comptroller of the Currency" in text:
+        return "OCC"
+    if "FHFA" in text or "Federal Housing Finance" in text:
+        return "FHFA"
+    if "SEC" in text or "Securities and Exchange" in text:
+        return "SEC"
+    if "CFPB" in text:
+        return "CFPB"
+    if "FCA" in text or "Farm Credit" in text:
+        return "FCA"
 
     return "UNKNOWN"
 
@@ -372,14 +331,31 @@ def _detect_header_columns(row_values):
     return cols
 
 
+def _cell_float(row, idx):
+    """Return cell *idx* of *row* as a float, or None if absent or not numeric."""
+    if idx is None or idx >= len(row) or row[idx] is None:
+        return None
+    try:
+        return float(row[idx])
+    except (ValueError, TypeError):
+        return None
+
+
 def _is_data_stop(val):
     """Check if a cell value indicates the end of labor category rows."""
     if val is None:
         return True
     s = str(val).strip().lower()
-    return s == "" or any(kw in s for kw in ("total", "subtotal", "section ii", "section iii",
-                                               "travel", "other direct", "grand total",
-                                               "reimbursable"))
+    # "total" also covers subtotal/grand total, "section ii" covers section iii
+    return (s == "" or "total" in s or "section ii" in s or "travel" in s
+            or "other direct" in s or "reimbursable" in s)
+
+
+_ORDER_RE = re.compile(r"Ordering\s+Period\s+([IVX]+|\d+)", re.IGNORECASE)
+_YEAR_RE = re.compile(r"Year\s+([IVX]+|\d+)", re.IGNORECASE)
+_NTH_YEAR_RE = re.compile(r"(\d+)\w*\s+Year", re.IGNORECASE)
+_ROMAN = {"I": 1, "II": 2, "III": 3, "IV": 4, "V": 5,
+          "VI": 6, "VII": 7, "VIII": 8, "IX": 9, "X": 10}
 
 
 def _parse_period_name(sheet_name: str) -> tuple:
@@ -390,25 +366,15 @@ def _parse_period_name(sheet_name: str) -> tuple:
     sn = sheet_name.strip()
 
     # "Ordering Period I" -> ("Ordering Period I", 1)
-    import re as _re
-    m = _re.search(r"Ordering\s+Period\s+([IVX]+|\d+)", sn, _re.IGNORECASE)
-    if m:
-        raw = m.group(1)
-        roman = {"I": 1, "II": 2, "III": 3, "IV": 4, "V": 5}
-        num = roman.get(raw.upper(), int(raw) if raw.isdigit() else 0)
-        return (sn, num)
-
     # "Year VI" / "Year VII" etc.
-    m = _re.search(r"Year\s+([IVX]+|\d+)", sn, _re.IGNORECASE)
+    m = _ORDER_RE.search(sn) or _YEAR_RE.search(sn)
     if m:
         raw = m.group(1)
-        roman = {"I": 1, "II": 2, "III": 3, "IV": 4, "V": 5,
-                 "VI": 6, "VII": 7, "VIII": 8, "IX": 9, "X": 10}
-        num = roman.get(raw.upper(), int(raw) if raw.isdigit() else 0)
+        num = _ROMAN.get(raw.upper(), int(raw) if raw.isdigit() else 0)
         return (sn, num)
 
     # "1st Year of Performance" etc.
-    m = _re.search(r"(\d+)\w*\s+Year", sn, _re.IGNORECASE)
+    m = _NTH_YEAR_RE.search(sn)
     if m:
         num = int(m.group(1))
         return (sn, num)
@@ -426,6 +392,15 @@ def _detect_site_type(sheet_name: str):
     return None
 
 
+# Year-rate header cells ("Year 2 Rate") and GSA IFF price columns ("(A)")
+_YEAR_NUM_RE = re.compile(r"year\s+(\d+)")
+_IFF_LETTER_RE = re.compile(r"\(([A-Z])\)")
+
+# Rows read up front by parse_pricing_sheet: enough for the 10-row header
+# scan plus the section-header and year-label rows that can follow it
+_HEAD_ROWS = 15
+
+
 def parse_pricing_sheet(ws, sheet_name: str) -> List[dict]:
     """Parse a single worksheet and return labor category rows.
 
@@ -434,12 +409,16 @@ def parse_pricing_sheet(ws, sheet_name: str) -> List[dict]:
     hourly_rate, estimated_hours, extended_price, period_name, period_number, site_type.
     """
     rows_data = []
-    all_rows = list(ws.iter_rows(min_row=1, max_row=ws.max_row, values_only=True))
+    # Only the first rows are needed to find the header and the data start;
+    # the rest of the sheet is streamed, so large price lists are never
+    # held in memory whole
+    rows = ws.iter_rows(min_row=1, max_row=ws.max_row, values_only=True)
+    head = list(islice(rows, _HEAD_ROWS))
 
     # Find header row (scan first 10 rows)
     header_cols = {}
     header_row_idx = None
-    for i, row in enumerate(all_rows[:10]):
+    for i, row in enumerate(head[:10]):
         cols = _detect_header_columns(row)
         if "category" in cols or ("clin" in cols and len(cols) >= 2):
             header_cols = cols
@@ -450,7 +429,7 @@ def parse_pricing_sheet(ws, sheet_name: str) -> List[dict]:
     # Column 0 has category name, column 1 has unit price, col 2 has quantity, col 3 extended total
     if not header_cols:
         # Check if row 1 has "Unit Price" in col 1 and row 2 has "Labor Categories" section header
-        for i, row in enumerate(all_rows[:5]):
+        for i, row in enumerate(head[:5]):
             text = " ".join(str(c) for c in row if c).lower()
             if "unit price" in text:
                 header_cols = {"category": 0, "rate": 1, "hours": 2, "price": 3}
@@ -462,8 +441,8 @@ def parse_pricing_sheet(ws, sheet_name: str) -> List[dict]:
 
     # Find where data starts (skip section headers)
     data_start = header_row_idx + 1
-    for i in range(header_row_idx + 1, min(header_row_idx + 5, len(all_rows))):
-        row = all_rows[i]
+    for i in range(header_row_idx + 1, min(header_row_idx + 5, len(head))):
+        row = head[i]
         cat_idx = header_cols.get("category", 0)
         val = row[cat_idx] if cat_idx < len(row) else None
         if val is not None:
@@ -488,14 +467,14 @@ def parse_pricing_sheet(ws, sheet_name: str) -> List[dict]:
     # Detect multi-year rate columns
     year_rate_cols = []
     if header_row_idx is not None:
-        hrow = all_rows[header_row_idx]
+        hrow = head[header_row_idx]
         for ci, val in enumerate(hrow):
             if not val:
                 continue
             vs = str(val).lower()
             if "year" in vs and "rate" in vs:
                 # Extract year number
-                m = re.search(r"year\s+(\d+)", vs)
+                m = _YEAR_NUM_RE.search(vs)
                 yr = int(m.group(1)) if m else 0
                 year_rate_cols.append((ci, yr))
 
@@ -505,16 +484,16 @@ def parse_pricing_sheet(ws, sheet_name: str) -> List[dict]:
         gsa_current_col = None
         for ci, val in enumerate(hrow):
             if val and "gsa price with iff" in str(val).lower():
-                letter_m = re.search(r"\(([A-Z])\)", str(val))
+                letter_m = _IFF_LETTER_RE.search(str(val))
                 if letter_m:
                     gsa_rate_cols.append(ci)
                 elif "as of" in str(val).lower() or "generation" in str(val).lower():
                     gsa_current_col = ci
-        if gsa_rate_cols and header_row_idx + 1 < len(all_rows):
-            year_row = all_rows[header_row_idx + 1]
+        if gsa_rate_cols and header_row_idx + 1 < len(head):
+            year_row = head[header_row_idx + 1]
             for ci in gsa_rate_cols:
                 if ci < len(year_row) and year_row[ci]:
-                    m = re.search(r"year\s+(\d+)", str(year_row[ci]).lower())
+                    m = _YEAR_NUM_RE.search(str(year_row[ci]).lower())
                     yr = int(m.group(1)) if m else 0
                     year_rate_cols.append((ci, yr))
             # Include the "current rate" column as a year entry
@@ -533,8 +512,7 @@ def parse_pricing_sheet(ws, sheet_name: str) -> List[dict]:
     # GSA-style dense tables: skip empty rows instead of stopping
     has_gsa_cols = bool(year_rate_cols and any("catalog_id" in header_cols for _ in [1]))
 
-    for i in range(data_start, len(all_rows)):
-        row = all_rows[i]
+    for row in chain(head[data_start:], rows):
         if cat_idx >= len(row):
             continue
         cat_name = row[cat_idx]
@@ -551,14 +529,6 @@ def parse_pricing_sheet(ws, sheet_name: str) -> List[dict]:
         if not cat_name or "labor categor" in cat_name.lower() or cat_name.lower().startswith("example"):
             continue
 
-        def _num(idx):
-            if idx is None or idx >= len(row) or row[idx] is None:
-                return None
-            try:
-                return float(row[idx])
-            except (ValueError, TypeError):
-                return None
-
         # Per-row site type (GSA price list has "Contractor_Facility" etc.)
         row_site = site_type
         if site_idx is not None and site_idx < len(row) and row[site_idx]:
@@ -581,16 +551,21 @@ def parse_pricing_sheet(ws, sheet_name: str) -> List[dict]:
             if ci < len(row) and row[ci]:
                 clin_val = str(row[ci]).strip()
 
+        # Cells shared by every period entry for this row
+        title = str(row[title_idx]).strip() if title_idx and title_idx < len(row) and row[title_idx] else ""
+        hours = _cell_float(row, hours_idx)
+        price = _cell_float(row, price_idx)
+
         # Multi-year rate columns (OCC / GSA pattern)
         if year_rate_cols:
             for col_idx, yr_num in year_rate_cols:
                 entry = {
                     "category_name": cat_name,
-                    "category_title": str(row[title_idx]).strip() if title_idx and title_idx < len(row) and row[title_idx] else "",
+                    "category_title": title,
                     "clin_number": clin_val,
-                    "hourly_rate": _num(col_idx),
-                    "estimated_hours": _num(hours_idx),
-                    "extended_price": _num(price_idx),
+                    "hourly_rate": _cell_float(row, col_idx),
+                    "estimated_hours": hours,
+                    "extended_price": price,
                     "period_name": f"Year {yr_num}",
                     "period_number": yr_num,
                     "site_type": row_site,
@@ -599,11 +574,11 @@ def parse_pricing_sheet(ws, sheet_name: str) -> List[dict]:
         else:
             entry = {
                 "category_name": cat_name,
-                "category_title": str(row[title_idx]).strip() if title_idx and title_idx < len(row) and row[title_idx] else "",
+                "category_title": title,
                 "clin_number": clin_val,
-                "hourly_rate": _num(rate_idx),
-                "estimated_hours": _num(hours_idx),
-                "extended_price": _num(price_idx),
+                "hourly_rate": _cell_float(row, rate_idx),
+                "estimated_hours": hours,
+                "extended_price": price,
                 "period_name": period_name,
                 "period_number": period_number,
                 "site_type": row_site,
@@ -618,7 +593,7 @@ def import_excel_pricing(db: ProcurementDatabase, filepath: Path, dry_run: bool)
     import openpyxl
 
     filename = filepath.name
-    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True, keep_links=False)
 
     agency = _infer_agency_from_excel(wb, filename)
     notice_id = generate_notice_id(filename, agency)
@@ -627,7 +602,7 @@ def import_excel_pricing(db: ProcurementDatabase, filepath: Path, dry_run: bool)
     sol_id = None
     for substring, nid in EXCEL_SOLICITATION_MAP.items():
         if substring in filename:
-            sol_id = get_solicitation_id(db, nid)
+            sol_id = db.get_solicitation_id(nid)
             if sol_id:
                 notice_id = nid
             break
@@ -638,6 +613,7 @@ def import_excel_pricing(db: ProcurementDatabase, filepath: Path, dry_run: bool)
 
     all_rows = []
     sheet_names = wb.sheetnames
+    # A GSA price list has "pricelist" in its name or a price-list sheet
     is_gsa = "pricelist" in filename.lower() or "price list" in " ".join(sheet_names).lower()
     for sn in sheet_names:
         if sn.strip().lower() in skip_sheets:
@@ -666,49 +642,46 @@ def import_excel_pricing(db: ProcurementDatabase, filepath: Path, dry_run: bool)
             print(f"    ... {len(all_rows) - len(seen)} additional period rows")
         return len(all_rows)
 
-    # Ensure solicitation record exists
-    if not sol_id:
-        sol_data = {
-            "notice_id": notice_id,
-            "solicitation_number": Path(filename).stem.replace("+", " "),
-            "title": Path(filename).stem.replace("+", " "),
-            "department": agency,
-            "type_of_notice": "pricing_worksheet",
-            "data_source": "local_import",
-            "url": f"local://{filename}",
-        }
-        sol_id = db.insert_solicitation(sol_data)
+    with db.transaction():  # one commit for the whole workbook
+        # Ensure solicitation record exists
         if not sol_id:
-            sol_id = get_solicitation_id(db, notice_id)
-
-    # Detect if this is a GSA price list (has "pricelist" in name or vendor info sheet)
-    is_gsa = "pricelist" in filename.lower() or "price list" in " ".join(wb.sheetnames).lower()
-
-    inserted = 0
-    for row in all_rows:
-        row["notice_id"] = notice_id
-        row["solicitation_id"] = sol_id
-        row["source_file"] = filename
-        row["agency"] = agency
-        row["data_source"] = "gsa_pricelist" if is_gsa else "excel_import"
-        row_id = db.insert_labor_category(row)
-        if row_id:
-            inserted += 1
+            title = filepath.stem.replace("+", " ")
+            sol_data = {
+                "notice_id": notice_id,
+                "solicitation_number": title,
+                "title": title,
+                "department": agency,
+                "type_of_notice": "pricing_worksheet",
+                "data_source": "local_import",
+                "url": f"local://{filename}",
+            }
+            # Returns the existing row's ID for a duplicate, so None means an error
+            sol_id = db.insert_solicitation(sol_data)
+            if not sol_id:
+                print(f"  WARNING: Failed to store solicitation record")
+                return 0
+
+        for row in all_rows:
+            row["notice_id"] = notice_id
+            row["solicitation_id"] = sol_id
+            row["source_file"] = filename
+            row["agency"] = agency
+            row["data_source"] = "gsa_pricelist" if is_gsa else "excel_import"
+        inserted = db.insert_labor_categories(all_rows)
 
     print(f"  Inserted {inserted} rows ({len(all_rows) - inserted} duplicates skipped)")
     return inserted
 
 
-def import_forecast(db: ProcurementDatabase, filepath: Path, dry_run: bool) -> int:
-    """Import a forecast PDF into the forecast_opportunities table."""
+def import_forecast(db: ProcurementDatabase, filepath: Path, dry_run: bool,
+                    text: Optional[str]) -> int:
+    """Import a forecast PDF, already extracted by load_text(), into forecast_opportunities."""
     filename = filepath.name
-    file_bytes = filepath.read_bytes()
 
-    if not is_valid_pdf(file_bytes):
+    if text is None:
         print(f"  SKIP (invalid PDF): {filename}")
         return 0
 
-    text = extract_text(filename, file_bytes)
     if not text.strip():
         print(f"  SKIP (no text extracted): {filename}")
         return 0
@@ -723,32 +696,31 @@ def import_forecast(db: ProcurementDatabase, filepath: Path, dry_run: bool) -> i
             print(f"    ... and {len(rows) - 5} more")
         return len(rows)
 
-    inserted = 0
-    for row in rows:
-        row_id = db.insert_forecast_opportunity(row)
-        if row_id:
-            inserted += 1
+    inserted = db.insert_forecast_opportunities(rows)
 
     print(f"  Inserted {inserted} new entries ({len(rows) - inserted} duplicates skipped)")
     return inserted
 
 
-def import_solicitation(db: ProcurementDatabase, filepath: Path, dry_run: bool) -> bool:
-    """Import a SOW/solicitation/PWS document into the database."""
+def import_solicitation(db: ProcurementDatabase, filepath: Path, dry_run: bool,
+                        text: Optional[str], content_sha256: Optional[bytes] = None) -> bool:
+    """Import a SOW/solicitation/PWS document, already extracted by load_text()."""
     filename = filepath.name
-    file_bytes = filepath.read_bytes()
 
-    # Validate PDFs
-    if filename.lower().endswith(".pdf") and not is_valid_pdf(file_bytes):
+    if text is None:
         print(f"  SKIP (invalid PDF): {filename}")
         return False
 
-    # Extract text
-    text = extract_text(filename, file_bytes)
     if not text or len(text.strip()) < 50:
         print(f"  SKIP (no/minimal text): {filename}")
         return False
 
+    # The same text was imported before, possibly under another file name
+    existing = db.find_notice_by_text(text)
+    if existing:
+        print(f"  SKIP (same text already imported as {existing}): {filename}")
+        return False
+
     # Classify and infer agency
     doc_role = classify_document(filename, text)
     agency = infer_agency(filename, text)
@@ -773,42 +745,42 @@ def import_solicitation(db: ProcurementDatabase, filepath: Path, dry_run: bool)
         return True
 
     # 1. Insert solicitation record
+    title = filepath.stem.replace("+", " ")
     sol_data = {
         "notice_id": notice_id,
-        "solicitation_number": Path(filename).stem.replace("+", " "),
-        "title": Path(filename).stem.replace("+", " "),
+        "solicitation_number": title,
+        "title": title,
         "description": text[:2000],
         "department": agency,
         "type_of_notice": doc_role,
         "data_source": "local_import",
         "url": file_url,
     }
+    # Returns the existing row's ID for a duplicate, so None means an error
     sol_row_id = db.insert_solicitation(sol_data)
     if not sol_row_id:
-        # May already exist (INSERT OR REPLACE) — look it up
-        sol_row_id = get_solicitation_id(db, notice_id)
+        print(f"  WARNING: Failed to store solicitation record")
+        return False
 
     # 2. Store document record
-    doc_id = store_document(db, {
+    stored = db.insert_document({
         "solicitation_id": sol_row_id,
         "notice_id": notice_id,
         "filename": filename,
         "file_url": file_url,
         "file_type": file_type,
         "doc_role": doc_role,
+        "content_sha256": content_sha256,
         "raw_text": text,
     })
 
-    if not doc_id:
-        # Document may already exist (INSERT OR IGNORE on file_url)
-        cursor = db.conn.cursor()
-        cursor.execute("SELECT id FROM opportunity_documents WHERE file_url = ?", (file_url,))
-        row = cursor.fetchone()
-        if row:
-            print(f"  Already imported (skipping analysis)")
-            return True
+    if not stored:
         print(f"  WARNING: Failed to store document record")
         return False
+    doc_id, created = stored
+    if not created:
+        print(f"  Already imported (skipping analysis)")
+        return True
 
     # 3. Run analysis pipeline (same as collect_documents.py)
     run_analysis(db, doc_id, sol_row_id, notice_id, doc_role, text)
@@ -848,7 +820,38 @@ def main():
 
     stats = {"imported": 0, "skipped": 0, "forecast": 0, "excel": 0, "errors": 0}
 
+    # Text extraction is the slow, CPU-bound part, so PDF/DOCX files are
+    # extracted ahead of the loop across worker processes, at most two per
+    # worker in flight so a large batch doesn't pile up in memory. The loop
+    # below still handles files (and all database writes) one at a time,
+    # in order. A document whose exact bytes were already parsed (by an
+    # earlier run or by collect_documents.py) reuses the stored text instead.
+    workers = os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers)
+    to_extract = deque()
+    texts = {}
+    digests = {}
+    stored_texts = {}
+    for f in files:
+        if f.name.startswith("~$") or f.name in INVALID_FILES or f.suffix.lower() == ".xlsx":
+            continue
+        if f.name not in FORECAST_FILES:
+            try:
+                digests[f] = file_sha256(f)
+            except OSError:
+                pass  # load_text() hits the same error and reports it below
+            else:
+                found = db.find_document_text(digests[f])
+                if found:
+                    stored_texts[f] = found[1]
+                    continue
+        to_extract.append(f)
+
     for filepath in files:
+        while to_extract and len(texts) < 2 * workers:
+            f = to_extract.popleft()
+            texts[f] = pool.submit(load_text, f, f.name in FORECAST_FILES)
+
         filename = filepath.name
         print(f"\n--- {filename} ---")
 
@@ -867,7 +870,7 @@ def main():
 
             # Forecast files get special handling
             if filename in FORECAST_FILES:
-                count = import_forecast(db, filepath, args.dry_run)
+                count = import_forecast(db, filepath, args.dry_run, texts.pop(filepath).result())
                 stats["forecast"] += count
                 continue
 
@@ -878,7 +881,16 @@ def main():
                 continue
 
             # Everything else: SOW / solicitation / PWS import
-            success = import_solicitation(db, filepath, args.dry_run)
+            # One commit for the solicitation, document and analysis rows;
+            # extraction has finished before the write lock is taken
+            if filepath in stored_texts:
+                print(f"  Content already parsed (reusing stored text)")
+                text = stored_texts[filepath]
+            else:
+                text = texts.pop(filepath).result()
+            with db.transaction():
+                success = import_solicitation(db, filepath, args.dry_run, text,
+                                              digests.get(filepath))
             if success:
                 stats["imported"] += 1
             else:
@@ -888,6 +900,7 @@ def main():
             print(f"  ERROR: {e}")
             stats["errors"] += 1
 
+    pool.shutdown()
     db.close()
 
     print(f"\n{'=' * 50}")
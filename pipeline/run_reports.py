@@ -13,6 +13,9 @@ Usage:
 import argparse
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from types import SimpleNamespace
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'analysis'))
 from database import ProcurementDatabase
@@ -27,35 +30,51 @@ from report_generator import (
 AGENCIES = ["FHFA", "SEC", "OCC", "CFPB", "FCA"]
 
 
+def _agency_report(db, agency):
+    """Generate and save one agency report on a pooled read-only connection.
+
+    Runs in a worker thread. The report generators only touch ``db.conn``,
+    so they get a stand-in whose ``conn`` is one of ``db``'s readers.
+    """
+    with db.reader() as conn:
+        html = generate_agency_report(SimpleNamespace(conn=conn), agency)
+    return save_report(html, "agency", agency)
+
+
 def run_daily():
     db = ProcurementDatabase()
+    # The agency reports are independent reads. SQLite releases the GIL while
+    # a query runs, so they overlap with each other and with the digest.
+    pool = ThreadPoolExecutor(max_workers=len(AGENCIES))
     try:
+        agency_paths = pool.map(partial(_agency_report, db), AGENCIES)
+
         # Daily digest
         html = generate_new_opportunities_report(db, days_back=1)
         path = save_report(html, "daily_digest")
         print(f"  Daily digest -> {path}")
 
         # Per-agency reports
-        for agency in AGENCIES:
-            html = generate_agency_report(db, agency)
-            path = save_report(html, "agency", agency)
+        for agency, path in zip(AGENCIES, agency_paths):
             print(f"  {agency} report -> {path}")
     finally:
+        pool.shutdown()
         db.close()
 
 
 def run_weekly():
     db = ProcurementDatabase()
+    pool = ThreadPoolExecutor(max_workers=len(AGENCIES))
     try:
+        agency_paths = pool.map(partial(_agency_report, db), AGENCIES)
+
         # Weekly digest
         html = generate_new_opportunities_report(db, days_back=7)
         path = save_report(html, "weekly_digest")
         print(f"  Weekly digest -> {path}")
 
         # Per-agency reports
-        for agency in AGENCIES:
-            html = generate_agency_report(db, agency)
-            path = save_report(html, "agency", agency)
+        for agency, path in zip(AGENCIES, agency_paths):
             print(f"  {agency} report -> {path}")
 
         # Market summary
@@ -63,6 +82,7 @@ def run_weekly():
         path = save_report(html, "market_summary")
         print(f"  Market summary -> {path}")
     finally:
+        pool.shutdown()
         db.close()
 
 
@@ -2,17 +2,37 @@
 SAM.gov Opportunities API client.
 """
 
+import hashlib
+import json
 import os
 import sys
+import tempfile
+import threading
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dataclasses import dataclass, field
-from typing import List, Optional
+from functools import lru_cache
+from itertools import chain, count
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 import config
 
+# orjson parses a full search page a couple of times faster than the stdlib
+# json behind resp.json(); both take the raw bytes and raise ValueError
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+
+# Transient server errors retried by SAMApiClient._get
+_RETRY_STATUSES = (500, 502, 503, 504)
 
 # Map notice type names to SAM.gov ptype codes
 NOTICE_TYPE_MAP = {
@@ -24,6 +44,34 @@ NOTICE_TYPE_MAP = {
 }
 
 
+class RateLimiter:
+    """Thread-safe token bucket allowing *rate* calls per second on average.
+
+    Callers block in acquire() until a token is available, so threads
+    sharing one limiter share one request budget.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / rate
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be made."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) / self.interval)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.interval
+            time.sleep(wait)
+
+
 @dataclass
 class Opportunity:
     notice_id: str = ""
@@ -49,10 +97,23 @@ class Opportunity:
 class SAMApiClient:
     """Client for the SAM.gov Opportunities API."""
 
-    def __init__(self):
+    def __init__(self, document_limiter: Optional[RateLimiter] = None):
         self.base_url = config.SAM_API_BASE_URL
         self.api_key = config.SAM_API_KEY
         self.session = requests.Session()
+        # Every notice worker runs its own attachment pool on this session, so
+        # size the per-host connection pool for all of them; the default of
+        # 10 would discard keep-alive connections under load. Only connection
+        # and read errors are retried here; 5xx answers go back through _get,
+        # so each retry is paced like a fresh request.
+        adapter = HTTPAdapter(
+            pool_maxsize=config.MAX_CONCURRENT_REQUESTS * config.MAX_CONCURRENT_DOWNLOADS,
+            max_retries=Retry(total=3, status=0, backoff_factor=2),
+        )
+        self.session.mount("https://", adapter)
+        # Paces description and attachment calls; search pages go unpaced
+        self.document_limiter = document_limiter or RateLimiter(
+            config.SAM_DOCUMENT_REQUESTS_PER_SECOND)
 
     def get_opportunities_paginated(
         self,
@@ -77,6 +138,31 @@ class SAMApiClient:
         Returns:
             List of Opportunity objects.
         """
+        opportunities: List[Opportunity] = []
+        for page in self.iter_opportunities_paginated(
+            max_results, page_size, posted_from, posted_to, notice_type, keyword
+        ):
+            opportunities.extend(page)
+        return opportunities
+
+    def iter_opportunities_paginated(
+        self,
+        max_results: int = 5000,
+        page_size: int = 100,
+        posted_from: str = "",
+        posted_to: str = "",
+        notice_type: str = "Solicitation",
+        keyword: str = "",
+    ) -> Iterator[List[Opportunity]]:
+        """
+        Yield opportunities one API page at a time.
+
+        Takes the same arguments as get_opportunities_paginated, so callers
+        can store each page while the next one is being fetched.
+
+        The first page reports totalRecords, so the remaining pages are then
+        requested concurrently and yielded in offset order.
+        """
         page_size = min(page_size, 1000)
         ptype = NOTICE_TYPE_MAP.get(notice_type, "o")
 
@@ -84,65 +170,90 @@ class SAMApiClient:
         from_date = _reformat_date(posted_from)
         to_date = _reformat_date(posted_to)
 
-        opportunities: List[Opportunity] = []
-        offset = 0
-
-        while len(opportunities) < max_results:
-            params = {
-                "api_key": self.api_key,
-                "postedFrom": from_date,
-                "postedTo": to_date,
-                "ptype": ptype,
-                "limit": page_size,
-                "offset": offset,
-            }
-            if keyword:
-                params["q"] = keyword
-
-            data = self._request_with_retry(params)
-
-            raw_opps = data.get("opportunitiesData", [])
-            if not raw_opps:
-                break
-
-            for item in raw_opps:
-                if len(opportunities) >= max_results:
+        params = {
+            "api_key": self.api_key,
+            "postedFrom": from_date,
+            "postedTo": to_date,
+            "ptype": ptype,
+            "limit": page_size,
+        }
+        if keyword:
+            params["q"] = keyword
+
+        def fetch(offset):
+            return self._request_with_retry(dict(params, offset=offset))
+
+        remaining = max_results
+        data = fetch(0)
+        total = data.get("totalRecords")
+        pool = None
+        if total is None:
+            # Unknown total: walk the pages one request at a time
+            later = map(fetch, count(page_size, page_size))
+        else:
+            pool = ThreadPoolExecutor(max_workers=config.MAX_CONCURRENT_REQUESTS)
+            later = pool.map(fetch, range(page_size, min(total, max_results), page_size))
+
+        try:
+            for data in chain([data], later):
+                raw_opps = data.get("opportunitiesData", [])
+                if not raw_opps:
                     break
-                opportunities.append(_parse_opportunity(item))
 
-            # If we got fewer than page_size, there are no more pages
-            if len(raw_opps) < page_size:
-                break
+                page = [_parse_opportunity(item) for item in raw_opps[:remaining]]
+                remaining -= len(page)
+                yield page
 
-            offset += page_size
+                # If we got fewer than page_size, there are no more pages
+                if remaining <= 0 or len(raw_opps) < page_size:
+                    break
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
 
-        return opportunities
+    def _get(self, url: str, limiter: Optional[RateLimiter] = None,
+             max_retries: int = 3, **kwargs):
+        """GET *url*, retrying transient 5xx answers with exponential backoff.
+
+        Every attempt first takes a token from *limiter*, when given. Returns
+        the last response; the caller checks its status.
+        """
+        for attempt in range(max_retries + 1):
+            if limiter:
+                limiter.acquire()
+            resp = self.session.get(url, **kwargs)
+            if resp.status_code not in _RETRY_STATUSES or attempt == max_retries:
+                return resp
+            resp.close()
+            wait = 2 ** attempt * 2  # 2s, 4s, 8s
+            print(f"    Server error ({resp.status_code}). Waiting {wait}s before retry {attempt + 1}/{max_retries}...")
+            time.sleep(wait)
 
     def _request_with_retry(self, params: dict, max_retries: int = 5) -> dict:
-        """Make an API request with exponential backoff on 429 errors."""
+        """Make an API request with exponential backoff on 429 and 5xx errors."""
         for attempt in range(max_retries):
-            resp = self.session.get(self.base_url, params=params, timeout=60)
+            resp = self._get(self.base_url, params=params, timeout=60)
             if resp.status_code == 429:
                 wait = 2 ** attempt * 10  # 10s, 20s, 40s, 80s, 160s
                 print(f"    Rate limited (429). Waiting {wait}s before retry {attempt + 1}/{max_retries}...")
                 time.sleep(wait)
                 continue
             resp.raise_for_status()
-            return resp.json()
+            return _json_loads(resp.content)
         # Final attempt — let it raise if it fails
-        resp = self.session.get(self.base_url, params=params, timeout=60)
+        resp = self._get(self.base_url, params=params, timeout=60)
         resp.raise_for_status()
-        return resp.json()
+        return _json_loads(resp.content)
 
     def get_description_html(self, notice_id: str) -> str:
         """Fetch the full HTML description for an opportunity."""
         url = f"https://api.sam.gov/prod/opportunities/v1/noticedesc"
         params = {"noticeid": notice_id, "api_key": self.api_key}
-        resp = self.session.get(url, params=params, timeout=60)
+        resp = self._get(url, self.document_limiter, params=params, timeout=60)
         resp.raise_for_status()
         # The API may return JSON with a 'content' field or raw HTML
         try:
-            data = resp.json()
+            data = _json_loads(resp.content)
             return data.get("content", data.get("description", resp.text))
         except ValueError:
             return resp.text
@@ -155,9 +266,9 @@ class SAMApiClient:
             "noticeid": notice_id,
             "limit": 1,
         }
-        resp = self.session.get(url, params=params, timeout=60)
+        resp = self._get(url, self.document_limiter, params=params, timeout=60)
         resp.raise_for_status()
-        data = resp.json()
+        data = _json_loads(resp.content)
         opps = data.get("opportunitiesData", [])
         if not opps:
             return []
@@ -165,10 +276,49 @@ class SAMApiClient:
 
     def download_attachment(self, file_url: str) -> bytes:
         """Download a file attachment by URL."""
-        resp = self.session.get(file_url, timeout=120)
+        resp = self._get(file_url, self.document_limiter, timeout=120)
         resp.raise_for_status()
         return resp.content
 
+    def download_attachment_to_file(
+        self,
+        file_url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> Tuple[Optional[Path], Optional[bytes], Optional[str], Optional[str]]:
+        """Stream a file attachment to a temporary file, hashing it on the way.
+
+        The body is written in 1 MB chunks, so large attachments are never
+        held in memory whole. The caller is responsible for deleting the file.
+
+        Passing the validators of an earlier download makes the request
+        conditional. Returns (path, SHA-256 digest, etag, last_modified) with
+        the response's validators; path and digest are None when the server
+        answers 304 Not Modified.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        with self._get(file_url, self.document_limiter, headers=headers,
+                       timeout=120, stream=True) as resp:
+            if resp.status_code == 304:
+                return None, None, etag, last_modified
+            resp.raise_for_status()
+            validators = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+            digest = hashlib.sha256()
+            with tempfile.NamedTemporaryFile(prefix="sam_", delete=False) as f:
+                try:
+                    for chunk in resp.iter_content(chunk_size=1 << 20):
+                        f.write(chunk)
+                        digest.update(chunk)
+                except BaseException:
+                    f.close()
+                    os.unlink(f.name)
+                    raise
+        return (Path(f.name), digest.digest()) + validators
+
 
 def _reformat_date(date_str: str) -> str:
     """Convert YYYY-MM-DD to MM/dd/yyyy."""
@@ -178,13 +328,30 @@ def _reformat_date(date_str: str) -> str:
     return dt.strftime("%m/%d/%Y")
 
 
+# Date formats accepted from the API, tried in order after the fast path
+_DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%m/%d/%Y")
+
+
+@lru_cache(maxsize=4096)
 def _parse_date(value: str) -> Optional[datetime]:
-    """Parse a date string from the API into a datetime, or None."""
+    """Parse a date string from the API into a datetime, or None.
+
+    Cached: a fetch repeats the same posted dates and deadlines across many
+    records, and datetimes are immutable, so sharing them is safe.
+    """
     if not value:
         return None
-    for fmt in ("%Y-%m-%d", "%Y-%m-%dT%H:%M:%S%z", "%m/%d/%Y"):
+    value = value.rstrip("Z")
+    # The usual shapes, YYYY-MM-DD and YYYY-MM-DDTHH:MM:SS, go straight to
+    # the C fromisoformat instead of raising through the strptime loop
+    if len(value) in (10, 19) and value[4:5] == "-" and value[10:11] in ("", "T"):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    for fmt in _DATE_FORMATS:
         try:
-            return datetime.strptime(value.rstrip("Z"), fmt.replace("%z", ""))
+            return datetime.strptime(value, fmt)
         except ValueError:
             continue
     return None
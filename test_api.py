@@ -4,11 +4,14 @@ import unittest
 import os
 import sys
 import sqlite3
+import tempfile
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'analysis'))
 from database import ProcurementDatabase
 from analytics import ProcurementAnalytics
+from sow_review import SOWReviewer
 
 
 class TestProcurementDatabase(unittest.TestCase):
@@ -81,13 +84,6 @@ class TestProcurementDatabase(unittest.TestCase):
         for sol in self.sample_solicitations:
             self.db.insert_solicitation(sol)
 
-        # Mark SBA set-asides as small business
-        cursor = self.db.conn.cursor()
-        cursor.execute(
-            "UPDATE solicitations SET is_small_business_setaside = 1 WHERE set_aside = 'SBA'"
-        )
-        self.db.conn.commit()
-
     def test_tables_created(self):
         cursor = self.db.conn.cursor()
         cursor.execute(
@@ -117,11 +113,103 @@ class TestProcurementDatabase(unittest.TestCase):
         # Should still be 3 (replaced, not duplicated)
         self.assertEqual(cursor.fetchone()[0], 3)
 
+    def test_insert_unchanged_solicitation_is_noop(self):
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT id, last_updated FROM solicitations WHERE notice_id = 'NOTICE-003'")
+        before = tuple(cursor.fetchone())
+        row_id = self.db.insert_solicitation(self.sample_solicitations[2])
+        cursor.execute("SELECT id, last_updated FROM solicitations WHERE notice_id = 'NOTICE-003'")
+        self.assertEqual(tuple(cursor.fetchone()), before)
+        self.assertEqual(row_id, before[0])
+
+    def test_transaction_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.insert_solicitation({'notice_id': 'NOTICE-004'})
+                raise RuntimeError('abort batch')
+        self.assertFalse(self.db.conn.in_transaction)
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM solicitations WHERE notice_id = 'NOTICE-004'")
+        self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_inserts_inside_transaction_defer_commit(self):
+        with self.db.transaction():
+            self.db.insert_solicitation({'notice_id': 'NOTICE-004'})
+            self.db.insert_solicitation({'notice_id': 'NOTICE-005'})
+            self.assertTrue(self.db.conn.in_transaction)
+        self.assertFalse(self.db.conn.in_transaction)
+        cursor = self.db.conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM solicitations')
+        self.assertEqual(cursor.fetchone()[0], 5)
+
+    def test_insert_solicitations_bulk(self):
+        inserted = self.db.insert_solicitations_bulk([
+            {'notice_id': 'NOTICE-001', 'title': 'Updated Title'},
+            {'notice_id': 'NOTICE-004', 'title': 'New Opportunity'},
+        ])
+        self.assertEqual(inserted, 1)
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT title FROM solicitations WHERE notice_id = 'NOTICE-001'")
+        self.assertEqual(cursor.fetchone()[0], 'Updated Title')
+        cursor.execute('SELECT COUNT(*) FROM solicitations')
+        self.assertEqual(cursor.fetchone()[0], 4)
+
+    def test_insert_from_sam_matches_dict_path(self):
+        opp = SimpleNamespace(
+            notice_id='NOTICE-005', solicitation_number='SOL-005', title='Help Desk',
+            description='Tier 1 support', department='FHFA', sub_tier='', office='OCIO',
+            naics_code='541513', naics_description='Facilities Support',
+            set_aside='SBA', posted_date=datetime(2024, 1, 2), response_deadline=None,
+            place_of_performance='Washington, DC', primary_contact='Jane Doe',
+            primary_contact_email='jane@example.gov', url='https://sam.gov/opp/5',
+        )
+        self.assertEqual(self.db.insert_from_sam([opp], 'Solicitation'), 1)
+        as_dict = {
+            'notice_id': 'NOTICE-006', 'solicitation_number': 'SOL-005', 'title': 'Help Desk',
+            'description': 'Tier 1 support', 'department': 'FHFA', 'sub_tier': '',
+            'office': 'OCIO', 'naics_code': '541513', 'naics_description': 'Facilities Support',
+            'set_aside': 'SBA', 'type_of_notice': 'Solicitation',
+            'posted_date': '2024-01-02T00:00:00', 'response_deadline': None,
+            'place_of_performance_city': 'Washington, DC', 'primary_contact_name': 'Jane Doe',
+            'primary_contact_email': 'jane@example.gov', 'url': 'https://sam.gov/opp/5',
+        }
+        self.db.insert_solicitation(as_dict)
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT * FROM solicitations WHERE notice_id IN ('NOTICE-005', 'NOTICE-006') ORDER BY notice_id"
+        )
+        from_sam, from_dict = [dict(r) for r in cursor.fetchall()]
+        for row in (from_sam, from_dict):
+            for key in ('id', 'notice_id', 'collected_date', 'last_updated'):
+                del row[key]
+        self.assertEqual(from_sam, from_dict)
+
     def test_get_agency_stats(self):
         stats = self.db.get_agency_stats('Department of Defense')
         self.assertEqual(stats['total_opps'], 2)
         self.assertEqual(stats['small_biz_opps'], 2)
 
+    def test_money_stored_as_cents(self):
+        self.db.insert_solicitation({
+            'notice_id': 'NOTICE-004', 'department': 'FHFA', 'estimated_value_high': 1500.25,
+        })
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT estimated_value_high FROM solicitations WHERE notice_id = 'NOTICE-004'")
+        self.assertEqual(cursor.fetchone()[0], 150025)
+        self.assertEqual(self.db.get_agency_stats('FHFA')['avg_value'], 1500.25)
+
+    def test_naics_description_stored_once(self):
+        for nid in ('NOTICE-005', 'NOTICE-006'):
+            self.db.insert_solicitation({
+                'notice_id': nid, 'naics_code': '236220',
+                'naics_description': 'Commercial Building Construction',
+            })
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT naics_description FROM naics_codes WHERE naics_code = '236220'")
+        self.assertEqual([r[0] for r in cursor.fetchall()], ['Commercial Building Construction'])
+        review = SOWReviewer(self.db).review_opportunity('NOTICE-005')
+        self.assertEqual(review['metadata']['naics_description'], 'Commercial Building Construction')
+
     def test_get_agency_stats_no_results(self):
         stats = self.db.get_agency_stats('Nonexistent Agency')
         self.assertEqual(stats['total_opps'], 0)
@@ -137,6 +225,190 @@ class TestProcurementDatabase(unittest.TestCase):
         self.assertIn('date', trends[0])
         self.assertIn('count', trends[0])
 
+    def test_document_text_deduplicated(self):
+        for i in range(2):
+            self.db.insert_document({
+                'notice_id': 'NOTICE-001',
+                'file_url': f'https://sam.gov/file/{i}',
+                'raw_text': 'FAR 52.212-4 Contract Terms and Conditions',
+            })
+        cursor = self.db.conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM doc_blobs')
+        self.assertEqual(cursor.fetchone()[0], 1)
+        cursor.execute('SELECT COUNT(DISTINCT raw_text_sha) FROM opportunity_documents')
+        self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_insert_document_returns_existing_id(self):
+        doc = {'notice_id': 'NOTICE-001', 'file_url': 'https://sam.gov/file/clauses.pdf'}
+        doc_id, created = self.db.insert_document(doc)
+        self.assertTrue(created)
+        self.assertEqual(self.db.insert_document(doc), (doc_id, False))
+        # The same file attached to another notice is its own document
+        other_id, created = self.db.insert_document(dict(doc, notice_id='NOTICE-002'))
+        self.assertTrue(created)
+        self.assertNotEqual(other_id, doc_id)
+
+    def test_batch_imports_skip_duplicates(self):
+        labor = {'notice_id': 'LOCAL-1', 'category_name': 'Analyst', 'period_number': 1, 'hourly_rate': 95.5}
+        self.assertIsNotNone(self.db.insert_labor_category(labor))
+        rows = [labor, dict(labor, period_number=2), dict(labor, period_number=2)]
+        self.assertEqual(self.db.insert_labor_categories(rows), 1)
+        self.assertIsNone(self.db.insert_labor_category(labor))
+
+        forecast = {'agency': 'SEC', 'project_description': 'Data platform', 'estimated_value_high': 250000.5}
+        self.assertEqual(self.db.insert_forecast_opportunities([forecast, forecast]), 1)
+        self.assertIsNone(self.db.insert_forecast_opportunity(forecast))
+        cents = self.db.conn.execute('SELECT estimated_value_high FROM forecast_opportunities').fetchone()[0]
+        self.assertEqual(cents, 25000050)
+
+    def test_description_html_compressed(self):
+        html = '<p>Provide IT support services.</p>' * 50
+        doc_id, _ = self.db.insert_document({
+            'notice_id': 'NOTICE-001', 'file_url': 'noticedesc:NOTICE-001',
+            'raw_text': 'Provide IT support services.', 'description_html': html,
+        })
+        stored = self.db.conn.execute('''
+            SELECT b.content FROM opportunity_documents d
+            JOIN doc_blobs b ON b.sha256 = d.description_html_sha WHERE d.id = ?
+        ''', (doc_id,)).fetchone()[0]
+        self.assertIsInstance(stored, bytes)
+        self.assertLess(len(stored), len(html))
+        self.assertEqual(self.db.get_description_html(doc_id), html)
+
+    def test_failed_download_replaced_on_retry(self):
+        doc = {'notice_id': 'NOTICE-001', 'file_url': 'https://sam.gov/file/sow.pdf'}
+        doc_id, _ = self.db.insert_document(dict(doc, download_status='error', parse_status='error'))
+        self.assertIsNone(self.db.get_document_validators(doc['file_url']))
+        retried = dict(doc, content_sha256=b'\x01' * 32, etag='"abc"', raw_text='Statement of Work')
+        self.assertEqual(self.db.insert_document(retried), (doc_id, True))
+        self.assertEqual(self.db.get_document_validators(doc['file_url']), ('"abc"', None, b'\x01' * 32))
+        # A successful download is kept as is
+        self.assertEqual(self.db.insert_document(dict(retried, etag='"def"')), (doc_id, False))
+
+    def test_find_document_text_by_content_hash(self):
+        self.db.insert_document({
+            'notice_id': 'NOTICE-001', 'file_url': 'https://sam.gov/file/sow.pdf',
+            'content_sha256': b'\x01' * 32, 'doc_role': 'sow', 'raw_text': 'Statement of Work',
+        })
+        self.db.insert_document({
+            'notice_id': 'NOTICE-001', 'file_url': 'https://sam.gov/file/broken.pdf',
+            'content_sha256': b'\x02' * 32, 'parse_status': 'error',
+        })
+        self.assertEqual(self.db.find_document_text(b'\x01' * 32), ('sow', 'Statement of Work'))
+        self.assertIsNone(self.db.find_document_text(b'\x02' * 32))
+
+    def test_find_notice_by_text(self):
+        self.db.insert_solicitation({'notice_id': 'LOCAL-GSA-sow', 'data_source': 'local_import'})
+        self.db.insert_document({
+            'notice_id': 'LOCAL-GSA-sow', 'file_url': 'local://sow.pdf',
+            'doc_role': 'sow', 'raw_text': 'Statement of Work',
+        })
+        self.assertEqual(self.db.find_notice_by_text('Statement of Work'), 'LOCAL-GSA-sow')
+        self.assertIsNone(self.db.find_notice_by_text('Performance Work Statement'))
+
+    def test_find_notice_by_text_ignores_sam_documents(self):
+        self.db.insert_solicitation({'notice_id': 'NOTICE-001'})
+        self.db.insert_document({
+            'notice_id': 'NOTICE-001', 'file_url': 'https://sam.gov/file/pws.pdf',
+            'doc_role': 'sow', 'raw_text': 'Performance Work Statement',
+        })
+        self.assertIsNone(self.db.find_notice_by_text('Performance Work Statement'))
+
+    def test_small_business_setaside_generated(self):
+        self.db.insert_solicitation({
+            'notice_id': 'NOTICE-004',
+            'set_aside': 'Total Small Business Set-Aside (FAR 19.5)',
+        })
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            'SELECT notice_id FROM solicitations WHERE is_small_business_setaside = 1 ORDER BY notice_id'
+        )
+        self.assertEqual([r[0] for r in cursor.fetchall()],
+                         ['NOTICE-001', 'NOTICE-002', 'NOTICE-004'])
+        cursor.execute(
+            "SELECT days_to_deadline FROM solicitations_with_deadline WHERE notice_id = 'NOTICE-001'"
+        )
+        self.assertIn(cursor.fetchone()[0], (29, 30))
+
+    def test_search_solicitations(self):
+        results = self.db.search_solicitations('cybersecurity')
+        self.assertEqual([r['notice_id'] for r in results], ['NOTICE-002'])
+        # Updates are reflected through the sync triggers
+        self.db.insert_solicitation({'notice_id': 'NOTICE-002', 'title': 'Network Upgrade'})
+        self.assertEqual(self.db.search_solicitations('cybersecurity'), [])
+        self.assertEqual(len(self.db.search_solicitations('network')), 1)
+
+    def test_description_stored_in_body_table(self):
+        cursor = self.db.conn.cursor()
+        cursor.execute('PRAGMA table_info(solicitations)')
+        self.assertNotIn('description', [r[1] for r in cursor.fetchall()])
+        cursor.execute('''
+            SELECT b.description FROM solicitation_bodies b
+            JOIN solicitations s ON s.id = b.solicitation_id
+            WHERE s.notice_id = 'NOTICE-002'
+        ''')
+        self.assertEqual(cursor.fetchone()[0], 'Annual cybersecurity audit')
+
+    def test_sow_json_round_trip(self):
+        doc_id, _ = self.db.insert_document({
+            'notice_id': 'NOTICE-001', 'file_url': 'https://sam.gov/file/sow',
+        })
+        self.db.insert_sow_analysis({
+            'document_id': doc_id, 'solicitation_id': None, 'notice_id': 'NOTICE-001',
+            'scope_summary': 'IT support', 'period_of_performance': None,
+            'place_of_performance': None,
+            'key_tasks': '["Help desk"]',
+            'labor_categories': '["Program Manager", "Analyst"]',
+            'deliverables': '[]', 'compliance_reqs': '["FedRAMP"]',
+            'ordering_mechanism': None, 'billing_instructions': None,
+            'confidence_score': 0.5, 'extraction_method': 'regex',
+            'created_at': datetime.now().isoformat(),
+        })
+        statements = []
+        self.db.conn.set_trace_callback(statements.append)
+        reviewer = SOWReviewer(self.db)
+        sow = reviewer.review_opportunity('NOTICE-001')['sow_analysis'][0]
+        self.db.conn.set_trace_callback(None)
+        # JSON columns must come back once, through json(): dict(Row) keeps the
+        # first of two same-named columns, which would be raw jsonb on 3.45+
+        for sql in (q for q in statements if 'json(' in q):
+            cols = [d[0] for d in self.db.conn.execute(sql).description]
+            self.assertEqual(len(cols), len(set(cols)), sql)
+        self.assertEqual(sow['labor_categories'], ['Program Manager', 'Analyst'])
+        self.assertEqual(sow['compliance_reqs'], ['FedRAMP'])
+        self.assertEqual(
+            reviewer.common_labor_categories('Defense'),
+            [('Analyst', 1), ('Program Manager', 1)],
+        )
+
+    def test_verify_plans_analyzes_on_scan(self):
+        self.db.conn.execute('DROP INDEX idx_department')
+        with self.assertWarnsRegex(RuntimeWarning, 'running ANALYZE'):
+            self.db.verify_plans()
+        self.assertEqual(
+            self.db.conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()[0], 1)
+
+    def test_reader_connections_are_read_only(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        db = ProcurementDatabase(os.path.join(tmp.name, 'reader.db'))
+        self.addCleanup(db.close)  # runs first, so -wal/-shm go with the directory
+        self.assertEqual(db._reader_count, 0)  # opened on first use
+        db.insert_solicitation({'notice_id': 'NOTICE-R', 'department': 'FHFA'})
+        with db.reader() as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM solicitations').fetchone()[0], 1)
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM solicitations")
+        self.assertEqual(db.get_agency_stats('FHFA')['total_opps'], 1)
+
+    def test_drop_and_recreate_indexes(self):
+        query = "SELECT COUNT(*) FROM sqlite_master WHERE type='index' AND name = 'idx_posted_date'"
+        self.db.drop_indexes()
+        self.assertEqual(self.db.conn.execute(query).fetchone()[0], 0)
+        self.db.insert_solicitation({'notice_id': 'NOTICE-004'})
+        self.db.create_indexes()
+        self.assertEqual(self.db.conn.execute(query).fetchone()[0], 1)
+
     def test_indexes_created(self):
         cursor = self.db.conn.cursor()
         cursor.execute(
@@ -145,9 +417,12 @@ class TestProcurementDatabase(unittest.TestCase):
         indexes = [row[0] for row in cursor.fetchall()]
         self.assertIn('idx_posted_date', indexes)
         self.assertIn('idx_department', indexes)
-        self.assertIn('idx_naics', indexes)
+        self.assertIn('idx_naics_cover', indexes)
+        self.assertNotIn('idx_naics', indexes)
         self.assertIn('idx_set_aside', indexes)
         self.assertIn('idx_response_deadline', indexes)
+        self.assertIn('idx_small_biz', indexes)
+        self.assertNotIn('idx_small_business', indexes)
 
 
 class TestProcurementAnalytics(unittest.TestCase):
@@ -193,12 +468,6 @@ class TestProcurementAnalytics(unittest.TestCase):
         for sol in solicitations:
             db.insert_solicitation(sol)
 
-        cursor = db.conn.cursor()
-        cursor.execute(
-            "UPDATE solicitations SET is_small_business_setaside = 1 WHERE set_aside = 'SBA'"
-        )
-        db.conn.commit()
-
     def test_agency_opportunity_report(self):
         report = self.analytics.agency_opportunity_report(limit=10)
         self.assertIsInstance(report, list)